@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+'''
+Compares ingest and latest_margins query latency across database backends.
+
+By default, benchmarks a SQLite database with the embedded profile
+(db.create_engine), an untuned SQLite database (plain sqlalchemy engine), and
+DuckDB (if duckdb_engine is installed), each in a temporary directory. Other
+engine URLs (ie: a scratch PostgreSQL database, whose tables are dropped
+afterwards) can be given on the command line. Backends whose drivers are not
+installed are skipped.
+'''
+
+import argparse
+import importlib.util
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import sqlalchemy
+from sqlalchemy.orm import Session
+
+from rsmarket import db
+from rsmarket.dbschema import Base
+
+DRIVERS = {
+    'duckdb': 'duckdb_engine',
+    'postgresql': 'psycopg2',
+}
+
+
+def make_mappings(n_items: int):
+    return {
+        str(i): dict(
+            id=i,
+            name=f'Item {i}',
+            examine='',
+            members=bool(i % 2),
+            value=i,
+            limit=100 + i % 1000,
+            icon=''
+        )
+        for i in range(1, n_items + 1)
+    }
+
+
+def make_snapshots(n_items: int, n_hours: int):
+    '''Yields API-like snapshots: 5m and latest prices every 5 minutes, and 1h prices every hour'''
+
+    end = int(time.time()) // 300 * 300
+    start = end - n_hours * 3600
+    for i, timestamp in enumerate(range(start, end, 300)):
+        avg = {
+            str(item): {
+                'avgHighPrice': 1000 + item + i % 7,
+                'highPriceVolume': 500 + item % 50,
+                'avgLowPrice': 990 + item - i % 5,
+                'lowPriceVolume': 400 + item % 30,
+            }
+            for item in range(1, n_items + 1)
+        }
+        yield {'endpoint': '5m', 'timestamp': timestamp, 'data': avg}
+        if timestamp % 3600 == 0:
+            yield {'endpoint': '1h', 'timestamp': timestamp, 'data': avg}
+        yield {
+            'endpoint': 'latest',
+            'timestamp': timestamp,
+            'data': {
+                str(item): {
+                    'high': 1000 + item + i % 3,
+                    'highTime': timestamp - 10,
+                    'low': 980 + item,
+                    'lowTime': timestamp - 20,
+                }
+                for item in range(1, n_items + 1)
+            }
+        }
+
+
+def driver_available(url: str):
+    dialect = url.split(':', 1)[0].split('+', 1)[0]
+    module = DRIVERS.get(dialect)
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def benchmark(engine, snapshots: list, queries: int):
+    mappings = make_mappings(len(snapshots[0]['data']))
+    db.initialize(mappings, engine)
+
+    start = time.perf_counter()
+    with Session(engine) as session:
+        for snapshot in snapshots:
+            db.log_prices_to_db(snapshot, session)
+    ingest = time.perf_counter() - start
+
+    query = db.latest_margins_query()
+    timings = []
+    with Session(engine) as session:
+        for _ in range(queries):
+            start = time.perf_counter()
+            n_rows = len(session.execute(query).all())
+            timings.append(time.perf_counter() - start)
+
+    return ingest, statistics.median(timings), n_rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'urls',
+        nargs='*',
+        help='Additional engine URLs to benchmark (their tables are dropped afterwards)'
+    )
+    parser.add_argument('-n', '--items', type=int, default=500)
+    parser.add_argument('-H', '--hours', type=int, default=6)
+    parser.add_argument('-q', '--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp())
+    backends = [
+        ('sqlite (embedded profile)', f'sqlite:///{tmp / "tuned.db"}', True),
+        ('sqlite (untuned)', f'sqlite:///{tmp / "untuned.db"}', False),
+        ('duckdb', f'duckdb:///{tmp / "bench.duckdb"}', True),
+    ] + [(url.split(':', 1)[0], url, True) for url in args.urls]
+
+    snapshots = list(make_snapshots(args.items, args.hours))
+    n_rows = sum(len(s['data']) for s in snapshots)
+    print(
+        f'Ingesting {len(snapshots)} snapshots ({n_rows} rows) of '
+        f'{args.items} items'
+    )
+
+    results = []
+    for name, url, tuned in backends:
+        if not driver_available(url):
+            print(f'Skipping {name}: driver not installed')
+            continue
+
+        create = db.create_engine if tuned else sqlalchemy.create_engine
+        engine = create(url)
+        try:
+            ingest, query, n_margins = benchmark(
+                engine, snapshots, args.queries
+            )
+        finally:
+            if url in args.urls:
+                Base.metadata.drop_all(engine)
+            engine.dispose()
+
+        results.append((name, ingest, query, n_margins))
+
+    print()
+    print(f'{"backend":28}  {"ingest (s)":>10}  {"rows/s":>9}  '
+          f'{"margins (ms)":>12}  {"rows":>5}')
+    for name, ingest, query, n_margins in results:
+        print(
+            f'{name:28}  {ingest:10.2f}  {n_rows / ingest:9.0f}  '
+            f'{query * 1000:12.1f}  {n_margins:5}'
+        )
+
+    # every backend should return the same margins
+    return 0 if len({r[3] for r in results}) <= 1 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
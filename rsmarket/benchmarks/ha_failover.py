@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+'''
+Verifies leader election between redundant loggers (rsmarket log --ha).
+
+Runs several logger processes against a temporary SQLite database, using
+file locks and a fake prices API with an accelerated clock. The current
+leader is killed partway through, then the script checks that every tick
+was requested by exactly one process (no duplicates) and logged to the
+database (no gaps).
+'''
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ITEM_IDS = range(1, 11)
+BASE_TIMESTAMP = 1_700_000_000
+
+
+def tick_at(start: float, period: float):
+    return int((time.time() - start) / period)
+
+
+def worker(db_url: str, lock_dir: str, start: float, period: float,
+           n_ticks: int, shard: bool, requests):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from rsmarket import api
+    from rsmarket.leader import LeaderElector, leader_only, lock_factory
+    from rsmarket.main import price_logger_factory
+
+    def fake_request(endpoint):
+        tick = tick_at(start, period)
+        requests.put((os.getpid(), endpoint, tick))
+        return {
+            'endpoint': endpoint,
+            'timestamp': BASE_TIMESTAMP + tick * 300,
+            'data': {
+                str(i): {
+                    'avgHighPrice': 100 + tick,
+                    'highPriceVolume': 1,
+                    'avgLowPrice': 90 + tick,
+                    'lowPriceVolume': 1,
+                }
+                for i in ITEM_IDS
+            },
+        }
+
+    api.request = fake_request
+
+    engine = create_engine(db_url)
+    elector = LeaderElector(lock_factory(engine, lock_dir), shard)
+    request_and_log = leader_only(
+        price_logger_factory(Session(engine)), elector
+    )
+
+    # log once per tick, at the same moment as every other instance
+    for tick in range(n_ticks):
+        time.sleep(max(0, start + (tick + 0.1) * period - time.time()))
+        request_and_log('5m')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--processes', type=int, default=2)
+    parser.add_argument('-t', '--ticks', type=int, default=10)
+    parser.add_argument(
+        '-k',
+        '--kill-after',
+        type=int,
+        default=4,
+        help='Kill the leader after this tick'
+    )
+    parser.add_argument(
+        '--period', type=float, default=0.5, help='Seconds per tick'
+    )
+    parser.add_argument('--shard', action='store_true')
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine, func, select
+
+    from rsmarket import db
+    from rsmarket.dbschema import AvgFiveMinPrice
+
+    tmp = Path(tempfile.mkdtemp())
+    db_url = f'sqlite:///{tmp / "ha.db"}'
+    engine = create_engine(db_url)
+    mappings = {
+        str(i): dict(
+            id=i, name=f'Item {i}', examine='', members=False, value=1,
+            icon=''
+        )
+        for i in ITEM_IDS
+    }
+    db.initialize(mappings, engine)
+
+    ctx = multiprocessing.get_context('spawn')
+    requests = ctx.Queue()
+    start = time.time() + 2
+    procs = [
+        ctx.Process(
+            target=worker,
+            args=(
+                db_url, str(tmp), start, args.period, args.ticks, args.shard,
+                requests
+            )
+        ) for _ in range(args.processes)
+    ]
+    for proc in procs:
+        proc.start()
+
+    # kill the leader halfway between two ticks
+    seen = []
+    killed = None
+    kill_time = start + (args.kill_after + 0.6) * args.period
+    time.sleep(max(0, kill_time - time.time()))
+    while not requests.empty():
+        seen.append(requests.get())
+    leader = seen[-1][0] if seen else None
+    if leader:
+        os.kill(leader, signal.SIGKILL)
+        killed = leader
+        print(f'Killed leader {leader} after tick {seen[-1][2]}')
+
+    for proc in procs:
+        proc.join()
+    while not requests.empty():
+        seen.append(requests.get())
+
+    ticks = sorted(tick for _, _, tick in seen)
+    duplicates = sorted({t for t in ticks if ticks.count(t) > 1})
+    missing = sorted(set(range(args.ticks)) - set(ticks))
+
+    with engine.connect() as conn:
+        logged = conn.execute(
+            select(func.count(AvgFiveMinPrice.timestamp.distinct()))
+        ).scalar()
+
+    leaders = sorted({pid for pid, _, _ in seen})
+    print(f'Ticks requested by processes: {leaders}')
+    print(f'Duplicate ticks: {duplicates or "none"}')
+    print(f'Missing ticks: {missing or "none"}')
+    print(f'Snapshots in database: {logged} of {args.ticks}')
+
+    ok = not duplicates and not missing and logged == args.ticks \
+        and killed is not None and len(leaders) > 1
+    print('OK' if ok else 'FAIL')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
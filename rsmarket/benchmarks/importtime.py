@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+'''
+Guards against startup time regressions of the rsmarket CLI.
+
+Measures the cumulative import time of rsmarket.main (using
+`python -X importtime`) and verifies that heavy database, numerical, and
+formatting libraries aren't imported by commands which don't need them.
+Also loads a full-size mappings file (as the search and recent commands do)
+and checks that loading its cached form is fast and imports none of them
+either, and that the recent command doesn't import any database libraries.
+Exits with a non-zero status if any check fails.
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+
+# modules which must only be imported by the subcommands that use them
+LAZY_MODULES = ('sqlalchemy', 'psycopg2', 'dotenv', 'tabulate', 'numpy')
+
+STARTUP_CODE = 'import rsmarket.main; rsmarket.main.get_parser()'
+
+# prints the time (in ms) taken to load item mappings from argv[1]
+LOAD_CODE = '''
+import sys, time
+from rsmarket import api
+start = time.perf_counter()
+api.load_mappings(sys.argv[1], download=False)
+print((time.perf_counter() - start) * 1000)
+'''
+
+# modules which must not be imported by the recent command, which only reads
+# prices from shared memory (it uses numpy and tabulate)
+DB_MODULES = ('sqlalchemy', 'psycopg2', 'dotenv')
+
+# publishes a 5m snapshot to shared memory, then runs `rsmarket recent` on it
+# with mappings from argv[1] (the store is created first, so its imports are
+# included in the measured times, but numpy is allowed anyway)
+RECENT_CODE = '''
+import os, sys
+from rsmarket import main
+from rsmarket.timeseries import RollingStore
+name = f'rsmarket-importtime-{os.getpid()}'
+with RollingStore.create([1], 12, name) as store:
+    store.append({'endpoint': '5m', 'timestamp': 1700000100, 'data': {
+        '1': {'avgHighPrice': 110, 'highPriceVolume': 5,
+              'avgLowPrice': 100, 'lowPriceVolume': 7}}})
+    os.environ['DATA_DIR'] = os.path.dirname(sys.argv[1])
+    sys.argv = ['rsmarket', 'recent', 'Item 1', '--shm', name]
+    main.main()
+'''
+
+# roughly the number of items in the real mappings endpoint
+N_ITEMS = 4500
+
+
+def make_mappings(fname: Path, n_items: int = N_ITEMS):
+    items = [
+        dict(
+            id=i,
+            name=f'Item {i}',
+            examine=f'An example item with the id {i}.',
+            members=bool(i % 2),
+            value=i,
+            limit=100,
+            lowalch=i // 3,
+            highalch=i // 2,
+            icon=f'Item_{i}.png'
+        ) for i in range(n_items)
+    ]
+    fname.write_text(json.dumps(items))
+
+
+def measure(code: str = STARTUP_CODE, *args: str):
+    '''
+    Runs code (with the given arguments) in a fresh interpreter and returns a
+    dict of top-level module names mapped to their cumulative import times
+    (in microseconds), and the code's output
+    '''
+
+    env = os.environ | {
+        'PYTHONPATH': os.pathsep.join(
+            filter(None, [str(PACKAGE_DIR), os.getenv('PYTHONPATH')])
+        )
+    }
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code, *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    # lines look like:
+    # "import time:  self [us] | cumulative | imported package"
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times, proc.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-b',
+        '--budget-ms',
+        type=float,
+        default=50,
+        help='Maximum allowed import time of rsmarket.main'
+    )
+    parser.add_argument(
+        '-l',
+        '--load-budget-ms',
+        type=float,
+        default=15,
+        help='Maximum allowed time to load cached item mappings'
+    )
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        type=int,
+        default=5,
+        help='Number of runs (the fastest one is reported)'
+    )
+    args = parser.parse_args()
+
+    runs = [measure()[0] for _ in range(args.repeat)]
+    best = min(run['rsmarket.main'] for run in runs) / 1000
+    print(
+        f'rsmarket.main imported in {best:.1f} ms '
+        f'(budget: {args.budget_ms:g} ms)'
+    )
+
+    ok = True
+    if best > args.budget_ms:
+        print('FAIL: import time exceeds budget')
+        ok = False
+
+    # the first load builds the cache, later loads should only read it
+    fname = Path(tempfile.mkdtemp()) / 'mappings.json'
+    make_mappings(fname)
+    measure(LOAD_CODE, str(fname))
+    loads = [measure(LOAD_CODE, str(fname)) for _ in range(args.repeat)]
+    best_load = min(float(output) for _, output in loads)
+    print(
+        f'{N_ITEMS} cached item mappings loaded in {best_load:.1f} ms '
+        f'(budget: {args.load_budget_ms:g} ms)'
+    )
+    if best_load > args.load_budget_ms:
+        print('FAIL: mappings load time exceeds budget')
+        ok = False
+
+    recent, output = measure(RECENT_CODE, str(fname))
+    if '110' not in output:
+        print('FAIL: recent did not show the published prices')
+        ok = False
+
+    checks = {
+        'at startup': (runs[0], LAZY_MODULES),
+        'by load_mappings': (loads[0][0], LAZY_MODULES),
+        'by recent': (recent, DB_MODULES),
+    }
+    for label, (times, modules) in checks.items():
+        imported = sorted(
+            mod for mod in modules
+            if any(name.split('.')[0] == mod for name in times)
+        )
+        if imported:
+            print(f'FAIL: modules imported {label}:', ', '.join(imported))
+            ok = False
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+'''
+Benchmarks db.convert_row_timestamps against the original per-cell
+conversion on a large result set, and verifies that both produce identical
+output.
+'''
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from dateutil import tz
+
+from rsmarket.db import convert_row_timestamps
+
+HEADERS = ['id', 'timestamp', 'high', 'highTime', 'low', 'lowTime']
+
+
+def format_timestamp_percell(timestamp: int, date_format='%b %d %Y %H:%M'):
+    '''The original implementation of dbschema.format_timestamp'''
+
+    utc = datetime.utcfromtimestamp(timestamp)
+    utc = utc.replace(tzinfo=tz.tzutc())
+    localtime = utc.astimezone(tz.tzlocal())
+    return localtime.strftime(date_format)
+
+
+def convert_row_timestamps_percell(rows, headers):
+    '''The original implementation of db.convert_row_timestamps'''
+
+    return [
+        tuple(
+            format_timestamp_percell(v) if 'time' in k.lower() else v
+            for k, v in zip(headers, row)
+        ) for row in rows
+    ]
+
+
+def make_rows(n: int, n_items: int = 4000):
+    '''Generates rows resembling a history dump of the latest endpoint'''
+
+    start = 1_690_000_000
+    rows = []
+    for i in range(n):
+        timestamp = start + (i // n_items) * 300
+        rows.append((
+            i % n_items, timestamp, random.randint(1, 10**6),
+            timestamp - random.randint(0, 3600), random.randint(1, 10**6),
+            timestamp - random.randint(0, 3600)
+        ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n',
+        '--rows',
+        type=int,
+        default=1_000_000,
+        help='Number of rows to convert'
+    )
+    parser.add_argument(
+        '-s',
+        '--skip-baseline',
+        action='store_true',
+        help='Only time the current implementation'
+    )
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+
+    start = time.perf_counter()
+    converted = convert_row_timestamps(rows, HEADERS)
+    elapsed = time.perf_counter() - start
+    print(f'convert_row_timestamps: {elapsed:.2f} s for {len(rows):,} rows')
+
+    if not args.skip_baseline:
+        start = time.perf_counter()
+        expected = convert_row_timestamps_percell(rows, HEADERS)
+        baseline = time.perf_counter() - start
+        print(
+            f'per-cell baseline:      {baseline:.2f} s '
+            f'({baseline / elapsed:.1f}x slower)'
+        )
+        assert converted == expected, 'conversions differ'
+
+
+if __name__ == '__main__':
+    main()
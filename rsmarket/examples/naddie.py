@@ -32,7 +32,7 @@ def demo(session: Session, engine: Engine):
 
     query = (
         select(ItemInfo.name, Price.timestamp, Price.avgHighPrice, Price.avgLowPrice)
-        .join(ItemInfo).where(ItemInfo.name == 'Yellow bead')
+        .join(ItemInfo).where(func.lower(ItemInfo.name) == 'yellow bead')  # case-insensitive (indexed)
         .where(ItemInfo.members == false())  # only list F2P items
         .where(Price.timestamp >= latest_time - 60 * 60 * 24 * 7) # show logs for the last 7 days
         # .limit(1000)  # limit rows
@@ -0,0 +1,183 @@
+import logging
+import os
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('price', 'spread', 'volume')
+
+# state arrays are indexed by (metric, stat, item id)
+COUNT, MEAN, VAR = range(3)
+
+# standard deviations are floored at this fraction of the mean, or at each
+# metric's minimum, so moves of items whose metrics were flat are still scored
+MIN_RELATIVE_STD = 0.01
+MIN_STD = {'price': 1, 'spread': 0.01, 'volume': 1}
+
+
+class Anomaly(NamedTuple):
+    id: int
+    timestamp: int
+    endpoint: str
+    metric: str
+    value: float
+    mean: float
+    zscore: float
+
+
+def snapshot_metrics(prices: dict):
+    '''
+    Extracts the tracked metrics from a prices dict (from an API endpoint).
+    Returns a tuple of (item ids, {metric: values}), where missing values are
+    nan. The latest endpoint has no volumes.
+    '''
+
+    data = prices['data']
+    n = len(data)
+    ids = np.fromiter(map(int, data), np.int64, n)
+
+    def column(key):
+        return np.fromiter(
+            (np.nan if (v := info.get(key)) is None else v
+             for info in data.values()),
+            float,
+            n
+        )
+
+    if prices['endpoint'] == 'latest':
+        high, low = column('high'), column('low')
+        volume = None
+    else:
+        high, low = column('avgHighPrice'), column('avgLowPrice')
+        volume = column('highPriceVolume') + column('lowPriceVolume')
+
+    # fall back to the only known price if the other one is missing
+    high, low = (
+        np.where(np.isnan(high), low, high),
+        np.where(np.isnan(low), high, low),
+    )
+    price = (high + low) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread = np.where(price > 0, (high - low) / price, np.nan)
+
+    metrics = {'price': price, 'spread': spread}
+    if volume is not None:
+        metrics['volume'] = volume
+    return ids, metrics
+
+
+class StreamingStats:
+    '''
+    Exponentially weighted mean and variance of each item's price, relative
+    spread, and traded volume, tracked separately for each endpoint. Each
+    snapshot is scored against the current statistics before being folded
+    into them, so every update is O(1) per item and vectorized across the
+    whole snapshot.
+    '''
+
+    def __init__(
+        self,
+        alpha: float = 0.1,
+        threshold: float = 4,
+        warmup: int = 12,
+        state: dict[str, np.ndarray] | None = None
+    ):
+        '''
+        :param alpha: Weight of each new observation (between 0 and 1)
+        :param threshold: Minimum absolute z-score of anomalies
+        :param warmup: Number of observations required before an item's anomalies are reported
+        :param state: Previously saved state arrays, keyed by endpoint
+        '''
+
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.state = state or {}
+
+    def _get_state(self, endpoint: str, size: int):
+        '''Returns an endpoint's state array, grown to fit item ids up to size'''
+
+        state = self.state.get(endpoint)
+        if state is None or state.shape[-1] < size:
+            grown = np.zeros((len(METRICS), 3, size))
+            if state is not None:
+                grown[..., :state.shape[-1]] = state
+            state = self.state[endpoint] = grown
+        return state
+
+    def update(self, prices: dict):
+        '''
+        Folds a prices dict (from an API endpoint) into the statistics and
+        returns a list of anomalies found in it
+        '''
+
+        start = time.perf_counter()
+        endpoint = prices['endpoint']
+        timestamp = prices.get('timestamp', int(time.time()))
+        ids, metrics = snapshot_metrics(prices)
+        if not len(ids):
+            return []
+
+        state = self._get_state(endpoint, int(ids.max()) + 1)
+        anomalies = []
+
+        for metric, x in metrics.items():
+            stats = state[METRICS.index(metric)]
+            valid = ~np.isnan(x)
+            idx, x = ids[valid], x[valid]
+            count, mean, var = stats[:, idx]
+
+            std = np.maximum(
+                np.sqrt(var),
+                np.maximum(MIN_RELATIVE_STD * np.abs(mean), MIN_STD[metric])
+            )
+            zscore = (x - mean) / std
+            flagged = (count >= self.warmup) \
+                & (np.abs(zscore) >= self.threshold)
+
+            anomalies += [
+                Anomaly(i, timestamp, endpoint, metric, v, m, z)
+                for i, v, m, z in zip(
+                    idx[flagged].tolist(), x[flagged].tolist(),
+                    mean[flagged].tolist(), zscore[flagged].tolist()
+                )
+            ]
+
+            # an item's first observation becomes its mean, with no variance
+            first = count == 0
+            delta = np.where(first, 0, x - mean)
+            stats[COUNT, idx] = count + 1
+            stats[MEAN, idx] = np.where(first, x, mean + self.alpha * delta)
+            stats[VAR, idx] = np.where(
+                first, 0, (1 - self.alpha) * (var + self.alpha * delta**2)
+            )
+
+        logger.debug(
+            'Updated %s statistics of %d items in %.2f ms', endpoint, len(ids),
+            (time.perf_counter() - start) * 1000
+        )
+        return anomalies
+
+    def save(self, fname: str | os.PathLike):
+        '''Atomically saves the statistics to a .npz file'''
+
+        fname = Path(fname)
+        tmp = fname.with_name(fname.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.savez(f, **self.state)
+        os.replace(tmp, fname)
+
+    @classmethod
+    def load(cls, fname: str | os.PathLike, **kwargs):
+        '''Loads statistics saved by save(), or returns empty statistics if the file doesn't exist'''
+
+        if not Path(fname).is_file():
+            return cls(**kwargs)
+
+        with np.load(fname) as npz:
+            state = {endpoint: npz[endpoint] for endpoint in npz.files}
+        return cls(**kwargs, state=state)
@@ -1,14 +1,25 @@
+import atexit
 import json
 import logging
 import os
+import threading
+import time
 from pathlib import Path
 from typing import Literal
 
-import requests
-
 DEFAULT_HEADERS = {'User-Agent': 'Market Experimentation'}
 HTTP_TIMEOUT_SEC = 10
 
+API_URL = 'https://prices.runescape.wiki/api/v1/osrs'
+MAPPINGS_URL = f'{API_URL}/mapping'
+RECIPES_URL = 'https://raw.githubusercontent.com/Flipping-Utilities/osrs-datasets/master/recipes.json'
+
+# refresh downloaded datasets in the background once they're a day old
+DEFAULT_MAX_AGE = 60 * 60 * 24
+
+# background refreshes, which short-lived commands wait for before exiting
+_refreshes: list[threading.Thread] = []
+
 
 def request(
     endpoint: Literal['latest', '5m', '1h', 'mapping'],
@@ -24,8 +35,10 @@ def request(
     :param headers: HTTP headers to send with the request
     '''
 
+    import requests
+
     data = requests.get(
-        f'https://prices.runescape.wiki/api/v1/osrs/{endpoint}',
+        f'{API_URL}/{endpoint}',
         headers=headers,
         timeout=HTTP_TIMEOUT_SEC
     ).json()
@@ -35,47 +48,136 @@ def request(
     return data
 
 
-def load_mappings(fname: str | os.PathLike, download: bool = True):
+def refresh_file(
+    fname: str | os.PathLike, url: str, headers=DEFAULT_HEADERS
+):
+    '''
+    Re-downloads a file if it has changed on the server, using the ETag saved
+    from the previous download. The file is replaced atomically, and its
+    modification time is updated even if it hasn't changed.
     '''
-    Returns a dictionary of item ids mapped to their static item info (from the 'mappings' endpoint)
 
-    :param fname: JSON file where item mappings are or will be stored
-    :param download: Whether to download the file from the API if it doesn't exist
+    import requests
+
+    fname = Path(fname)
+    etag_file = fname.with_name(fname.name + '.etag')
+    headers = dict(headers)
+    if etag_file.is_file() and fname.is_file():
+        headers['If-None-Match'] = etag_file.read_text().strip()
+
+    response = requests.get(url, headers=headers, timeout=HTTP_TIMEOUT_SEC)
+    response.raise_for_status()
+
+    if response.status_code == 304:
+        logging.debug('%s is up to date', fname)
+        fname.touch()
+        return False
+
+    # ensure the response is valid JSON before replacing the file
+    response.json()
+    tmp = fname.with_name(fname.name + '.tmp')
+    tmp.write_bytes(response.content)
+    os.replace(tmp, fname)
+    if etag := response.headers.get('ETag'):
+        etag_file.write_text(etag)
+    else:
+        etag_file.unlink(missing_ok=True)
+    logging.info('Downloaded %s', fname)
+    return True
+
+
+def _ensure_file(
+    fname: str | os.PathLike, url: str, download: bool, max_age: float | None
+):
+    '''
+    Downloads a file if it doesn't exist, or starts refreshing it in a
+    background thread if it's older than max_age seconds. The refreshed file
+    will be used the next time it's loaded. At exit, the refresh is given up
+    to HTTP_TIMEOUT_SEC to finish.
     '''
 
-    if not Path(fname).is_file():
+    path = Path(fname)
+    if not path.is_file():
         if not download:
             raise FileNotFoundError(f'{fname} not found. Did you download it?')
+        logging.info('Downloading %s', fname)
+        refresh_file(fname, url)
+        return
 
-        logging.info('Downloading mappings to %s', fname)
-        mapping = request('mapping')
-        with open(fname, 'w') as f:
-            json.dump(mapping, f)
+    if download and max_age is not None \
+            and time.time() - path.stat().st_mtime > max_age:
 
-    with open(fname) as f:
-        return {str(m['id']): m for m in json.load(f)}
+        def refresh():
+            try:
+                refresh_file(fname, url)
+            except Exception as exc:
+                logging.warning('Unable to refresh %s: %s', fname, exc)
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        if not _refreshes:
+            atexit.register(_join_refreshes)
+        _refreshes.append(thread)
+
+
+def _join_refreshes(timeout: float = HTTP_TIMEOUT_SEC):
+    '''Waits up to timeout seconds (in total) for background refreshes'''
 
+    deadline = time.monotonic() + timeout
+    for thread in _refreshes:
+        thread.join(max(0, deadline - time.monotonic()))
 
-def load_recipes(fname: str | os.PathLike, download: bool = True):
+
+def load_mappings(
+    fname: str | os.PathLike,
+    download: bool = True,
+    max_age: float | None = DEFAULT_MAX_AGE
+):
     '''
-    Returns a list of item recipes (from Flipping-utilities/osrs-datasets)
+    Returns a read-only dict-like object of item ids mapped to their static
+    item info (from the 'mappings' endpoint). The mappings are cached in a
+    compact binary form next to the JSON file.
 
-    :param fname: JSON file where item recipes are or will be stored
-    :param download: Whether to download the file from GitHub if it doesn't exist
+    :param fname: JSON file where item mappings are or will be stored
+    :param download: Whether to download the file from the API if it doesn't exist (or refresh it)
+    :param max_age: Age in seconds after which the file is refreshed in the background (None to disable)
     '''
 
-    if not Path(fname).is_file():
-        if not download:
-            raise FileNotFoundError(f'{fname} not found. Did you download it?')
+    from .cache import ItemMappings
 
-        logging.info('Downloading recipes to %s', fname)
-        recipes = requests.get(
-            'https://raw.githubusercontent.com/Flipping-Utilities/osrs-datasets/master/recipes.json',
-            timeout=HTTP_TIMEOUT_SEC
-        ).json()
+    _ensure_file(fname, MAPPINGS_URL, download, max_age)
+    return ItemMappings.load(fname)
 
-        with open(fname, 'w') as f:
-            json.dump(recipes, f)
 
+def load_recipes(
+    fname: str | os.PathLike,
+    download: bool = True,
+    max_age: float | None = DEFAULT_MAX_AGE
+):
+    '''
+    Returns a list of item recipes (from Flipping-utilities/osrs-datasets)
+
+    :param fname: JSON file where item recipes are or will be stored
+    :param download: Whether to download the file from GitHub if it doesn't exist (or refresh it)
+    :param max_age: Age in seconds after which the file is refreshed in the background (None to disable)
+    '''
+
+    _ensure_file(fname, RECIPES_URL, download, max_age)
     with open(fname) as f:
         return json.load(f)
+
+
+def load_recipe_index(
+    fname: str | os.PathLike,
+    download: bool = True,
+    max_age: float | None = DEFAULT_MAX_AGE
+):
+    '''
+    Same as load_recipes, but returns a compiled recipes.RecipeIndex which is
+    cached in a compact binary form next to the JSON file
+    '''
+
+    from .recipes import RecipeIndex
+
+    _ensure_file(fname, RECIPES_URL, download, max_age)
+    return RecipeIndex.load(fname)
@@ -0,0 +1,203 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from .dbschema import AvgFiveMinPrice, AvgHourPrice, ItemInfo
+from .recipes import ge_tax
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('avgHighPrice', 'avgLowPrice', 'highPriceVolume', 'lowPriceVolume')
+
+# items can only be bought up to their limit once every four hours
+BUY_LIMIT_HOURS = 4
+
+
+class History(NamedTuple):
+    '''
+    Columnar price history, where each array in values has one row per item
+    and one column per timestamp. Timestamps are evenly spaced by interval,
+    so buckets which weren't logged are columns of missing (nan) prices.
+    '''
+
+    item_ids: np.ndarray
+    limits: np.ndarray
+    timestamps: np.ndarray
+    interval: int
+    values: dict[str, np.ndarray]
+
+
+class Strategy(NamedTuple):
+    '''
+    A flipping strategy which buys up to the buy limit at the low price, then
+    sells at the high price after a fixed holding period. Anything left
+    unsold at the end of the holding period is instantly sold at the low price.
+
+    :param hold_hours: Hours between buying and selling
+    :param volume_frac: Fraction of each bucket's traded volume which our offers can fill
+    :param min_margin: Minimum post-tax margin (at the time of buying) required to enter a trade
+    :param entry_hours: Hours between consecutive purchases of the same item
+    '''
+
+    hold_hours: float = 1
+    volume_frac: float = 0.1
+    min_margin: float = 1
+    entry_hours: float = BUY_LIMIT_HOURS
+
+
+def load_history(session: Session, endpoint: str = '1h', days: float = 7):
+    '''Loads the last few days of 5m or 1h prices into columnar arrays'''
+
+    cls = {'5m': AvgFiveMinPrice, '1h': AvgHourPrice}[endpoint]
+    interval = {'5m': 5 * 60, '1h': 60 * 60}[endpoint]
+
+    ts_max = select(func.max(cls.timestamp)).scalar_subquery()
+    query = (
+        select(cls.id, cls.timestamp, *(getattr(cls, f) for f in FIELDS))  #
+        .where(cls.timestamp > ts_max - days * 60 * 60 * 24)  #
+    )
+    rows = session.execute(query).all()
+    data = np.array(rows, dtype=float).reshape(-1, 2 + len(FIELDS))
+
+    item_ids, rows_idx = np.unique(data[:, 0].astype(np.int64),
+                                   return_inverse=True)
+
+    # index columns by time rather than by the timestamps which were logged,
+    # so missing buckets don't shorten holding periods or entry spacing
+    ts = data[:, 1].astype(np.int64)
+    if len(ts):
+        t0, t1 = ts.min(), ts.max()
+        timestamps = np.arange(t0, t1 + interval, interval)
+        cols_idx = (ts - t0) // interval
+    else:
+        timestamps = cols_idx = np.empty(0, dtype=np.int64)
+
+    values = {}
+    for i, field in enumerate(FIELDS):
+        arr = np.full((len(item_ids), len(timestamps)), np.nan)
+        arr[rows_idx, cols_idx] = data[:, 2 + i]
+        values[field] = arr
+
+    limits = dict(
+        session.execute(
+            select(ItemInfo.id, ItemInfo.limit)  #
+            .where(ItemInfo.id.in_(item_ids.tolist()))  #
+        ).all()
+    )
+    limits_arr = np.array([limits.get(i) or 0 for i in item_ids.tolist()],
+                          dtype=float)
+
+    logger.debug(
+        'Loaded %d items x %d timestamps of %s history', len(item_ids),
+        len(timestamps), endpoint
+    )
+    return History(item_ids, limits_arr, timestamps, interval, values)
+
+
+def _ffill(arr: np.ndarray):
+    '''Forward fills nan values along each row'''
+
+    idx = np.where(~np.isnan(arr), np.arange(arr.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return arr[np.arange(arr.shape[0])[:, None], idx]
+
+
+def _max_drawdown(pnl: np.ndarray):
+    '''Returns the maximum drawdown of each row's cumulative profit'''
+
+    equity = np.cumsum(pnl, axis=1)
+    peak = np.maximum.accumulate(np.maximum(equity, 0), axis=1)
+    return (peak - equity).max(axis=1, initial=0)
+
+
+def simulate(history: History, strategy: Strategy):
+    '''
+    Simulates a strategy on every item at every entry timestamp at once.
+    Returns a dict of per-item arrays (aligned with history.item_ids)
+    containing the total profit, number of trades, buy and sell fill rates,
+    and maximum drawdown.
+    '''
+
+    hold = max(1, round(strategy.hold_hours * 60 * 60 / history.interval))
+    step = max(1, round(strategy.entry_hours * 60 * 60 / history.interval))
+    n_items, n_times = history.values['avgHighPrice'].shape
+
+    entries = np.arange(0, max(n_times - hold, 0), step)
+    exits = entries + hold
+
+    high = _ffill(history.values['avgHighPrice'])
+    low = _ffill(history.values['avgLowPrice'])
+    high_vol = np.nan_to_num(history.values['highPriceVolume'])
+    low_vol = np.nan_to_num(history.values['lowPriceVolume'])
+
+    buy = low[:, entries]
+    expected = high[:, entries] - ge_tax(high[:, entries]) - buy
+    enter = np.nan_to_num(expected) >= strategy.min_margin
+    want = np.where(enter & ~np.isnan(buy), history.limits[:, None], 0)
+
+    # our buy offers are filled by instasells (low price volume) and vice versa
+    bought = np.minimum(
+        want, np.floor(strategy.volume_frac * low_vol[:, entries])
+    )
+    sold = np.minimum(
+        bought, np.floor(strategy.volume_frac * high_vol[:, exits])
+    )
+    unsold = bought - sold
+
+    sell = np.nan_to_num(high[:, exits])
+    dump = np.nan_to_num(low[:, exits])
+    pnl = (
+        sold * (sell - ge_tax(sell)) + unsold * (dump - ge_tax(dump))
+        - bought * np.nan_to_num(buy)
+    )
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fill_rate = np.nan_to_num(bought.sum(axis=1) / want.sum(axis=1))
+        sell_rate = np.nan_to_num(sold.sum(axis=1) / bought.sum(axis=1))
+
+    return {
+        'pnl': pnl.sum(axis=1),
+        'trades': (bought > 0).sum(axis=1),
+        'fill_rate': fill_rate,
+        'sell_rate': sell_rate,
+        'drawdown': _max_drawdown(pnl),
+        'portfolio_drawdown': _max_drawdown(pnl.sum(axis=0)[None, :])[0],
+    }
+
+
+_history: History | None = None
+
+
+def _init_worker(history: History):
+    global _history
+    _history = history
+
+
+def _simulate_worker(strategy: Strategy):
+    return simulate(_history, strategy)
+
+
+def sweep(
+    history: History,
+    strategies: list[Strategy],
+    processes: int | None = None
+):
+    '''
+    Simulates several strategies in parallel. The history is sent to each
+    worker process once, rather than once per strategy. Returns a list of
+    results in the same order as strategies.
+    '''
+
+    processes = min(processes or os.cpu_count() or 1, len(strategies))
+    if processes <= 1:
+        return [simulate(history, strategy) for strategy in strategies]
+
+    with ProcessPoolExecutor(
+        processes, initializer=_init_worker, initargs=(history, )
+    ) as executor:
+        return list(executor.map(_simulate_worker, strategies))
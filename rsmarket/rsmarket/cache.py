@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import marshal
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# increment whenever the layout of any cached file changes
+CACHE_VERSION = 2
+
+
+def load_cache(
+    source: str | os.PathLike, build: Callable[[bytes], dict[str, Any]]
+):
+    '''
+    Returns a dict of columns built from the contents of a source file, which
+    are cached (using marshal, so loading doesn't require any heavy imports)
+    to a .cache file next to the source. Columns may be lists, bytes, or any
+    other builtin types supported by marshal. The cache is rebuilt whenever
+    the SHA-256 hash of the source file changes (the hash is only recomputed
+    if the file's size or modification time have changed).
+
+    :param source: Source file (ie: mappings.json)
+    :param build: Function which converts the source file's contents into a dict of columns
+    '''
+
+    source = Path(source)
+    cache = source.with_suffix('.cache')
+    stat = source.stat()
+    signature = (
+        CACHE_VERSION, marshal.version, stat.st_size, stat.st_mtime_ns
+    )
+
+    contents = None
+    if cache.is_file():
+        try:
+            cached_signature, cached_hash, columns = marshal.loads(
+                cache.read_bytes()
+            )
+            if cached_signature == signature:
+                return columns
+
+            # the source was touched, but may not have changed
+            if cached_signature[:2] == signature[:2]:
+                contents = source.read_bytes()
+                digest = hashlib.sha256(contents).hexdigest()
+                if digest == cached_hash:
+                    _save(cache, columns, signature, digest)
+                    return columns
+        except (OSError, ValueError, EOFError, TypeError):
+            logger.warning('Ignoring invalid cache file %s', cache)
+
+    logger.debug('Rebuilding cache %s', cache)
+    if contents is None:
+        contents = source.read_bytes()
+    columns = build(contents)
+    _save(cache, columns, signature, hashlib.sha256(contents).hexdigest())
+    return columns
+
+
+def _save(cache: Path, columns: dict, signature: tuple, digest: str):
+    '''Atomically saves columns and their cache metadata to a .cache file'''
+
+    tmp = cache.with_name(cache.name + '.tmp')
+    tmp.write_bytes(marshal.dumps((signature, digest, columns)))
+    os.replace(tmp, cache)
+
+
+class ItemMappings(Mapping):
+    '''
+    Static item info (from the 'mapping' endpoint) stored as a struct of
+    columns. Behaves like a read-only dict of string item ids mapped to item
+    info dicts, which are only created when accessed.
+    '''
+
+    INT_FIELDS = ('value', 'limit', 'lowalch', 'highalch')
+    STR_FIELDS = ('name', 'examine', 'icon')
+
+    def __init__(self, columns: dict[str, list]):
+        self.ids = columns['id']
+        self.members = columns['members']
+        self.ints = {field: columns[field] for field in self.INT_FIELDS}
+        self.strings = {field: columns[field] for field in self.STR_FIELDS}
+        self.positions = {
+            str(item_id): i
+            for i, item_id in enumerate(self.ids)
+        }
+
+    @classmethod
+    def build(cls, contents: bytes):
+        '''Converts the contents of mappings.json into a dict of columns'''
+
+        items = json.loads(contents)
+        columns = {
+            'id': [m['id'] for m in items],
+            'members': [bool(m['members']) for m in items],
+        }
+        # optional integer fields are missing (None) for some items
+        for field in cls.INT_FIELDS:
+            columns[field] = [m.get(field) for m in items]
+        for field in cls.STR_FIELDS:
+            columns[field] = [m.get(field) or '' for m in items]
+        return columns
+
+    @classmethod
+    def load(cls, fname: str | os.PathLike):
+        '''Loads item mappings from a JSON file (using its cached binary form if possible)'''
+
+        return cls(load_cache(fname, cls.build))
+
+    def __getitem__(self, item_id: str | int):
+        i = self.positions[str(item_id)]
+        info = {
+            'id': self.ids[i],
+            'members': self.members[i],
+        }
+        for field, values in self.ints.items():
+            if (value := values[i]) is not None:
+                info[field] = value
+        for field, strings in self.strings.items():
+            info[field] = strings[i]
+        return info
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, item_id):
+        return str(item_id) in self.positions
+
+    def name(self, item_id: str | int, default=None):
+        '''Returns an item's name without building its info dict'''
+
+        i = self.positions.get(str(item_id))
+        return default if i is None else self.strings['name'][i]
@@ -0,0 +1,188 @@
+import time
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from .cache import ItemMappings
+from .db import PRICE_CLASSES
+
+# expected interval between logged snapshots of each endpoint
+BUCKET_SECONDS = {
+    'latest': 300,
+    '5m': 300,
+    '1h': 3600,
+}
+
+# buckets are logged some time after they end (see logger.loop), and the API
+# may lag further, so buckets which ended more recently aren't expected yet
+GRACE_SECONDS = 60
+
+# databases which can count rows per timestamp and per item in one pass
+GROUPING_SETS_DIALECTS = ('postgresql', 'duckdb')
+
+
+def _grouped_counts(session: Session, cls, since: int, until: int):
+    '''
+    Counts the rows of a price table in [since, until) for each timestamp and
+    for each item. Returns a tuple of (timestamps, counts), (ids, counts).
+    '''
+
+    count = func.count()
+    where = (cls.timestamp >= since, cls.timestamp < until)
+
+    if session.get_bind().dialect.name in GROUPING_SETS_DIALECTS:
+        rows = session.execute(
+            select(cls.timestamp, cls.id, count)  #
+            .where(*where)  #
+            .group_by(func.grouping_sets(cls.timestamp, cls.id))  #
+        ).all()
+        per_timestamp = [(ts, n) for ts, item_id, n in rows if item_id is None]
+        per_item = [(item_id, n) for ts, item_id, n in rows if ts is None]
+    else:
+        per_timestamp = session.execute(
+            select(cls.timestamp, count).where(*where).group_by(cls.timestamp)
+        ).all()
+        per_item = session.execute(
+            select(cls.id, count).where(*where).group_by(cls.id)
+        ).all()
+
+    def to_arrays(pairs):
+        arr = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        return arr[:, 0], arr[:, 1]
+
+    return to_arrays(per_timestamp), to_arrays(per_item)
+
+
+def _ranges(buckets: np.ndarray, bucket: int):
+    '''Collapses sorted bucket indices into a list of consecutive ranges'''
+
+    if not len(buckets):
+        return []
+    breaks = np.flatnonzero(np.diff(buckets) != 1) + 1
+    return [
+        {
+            'start': int(run[0]) * bucket,
+            'end': (int(run[-1]) + 1) * bucket,
+            'buckets': len(run),
+        } for run in np.split(buckets, breaks)
+    ]
+
+
+def endpoint_coverage(
+    session: Session,
+    endpoint: str,
+    since: int,
+    until: int,
+    bucket: int | None = None,
+    sparse: float = 0.5,
+    limit: int = 20,
+    grace: int = GRACE_SECONDS,
+    mappings: ItemMappings | None = None
+):
+    '''
+    Reports the coverage of an endpoint's logged prices between two timestamps:
+    missing buckets (as ranges), rows per bucket (including buckets with
+    unusually few rows), and items with sparse coverage. Only buckets which
+    have ended (plus a grace period) by the until timestamp are expected to
+    be logged.
+
+    :param bucket: Bucket size in seconds (default: the endpoint's logging interval)
+    :param sparse: Items logged in fewer than this fraction of the logged buckets are sparse
+    :param limit: Maximum number of low buckets and sparse items to list
+    :param grace: Seconds after a bucket ends before it must be logged
+    :param mappings: Item mappings used to name sparse items
+    '''
+
+    bucket = bucket or BUCKET_SECONDS[endpoint]
+    cls = PRICE_CLASSES[endpoint]
+    (timestamps, ts_counts), (ids, id_counts) = _grouped_counts(
+        session, cls, since, until
+    )
+
+    # several timestamps may fall into the same bucket (ie: latest prices)
+    present, inverse = np.unique(timestamps // bucket, return_inverse=True)
+    rows_per_bucket = np.bincount(inverse, weights=ts_counts).astype(np.int64)
+
+    # rows just after since may fall into a partial bucket before the first
+    # expected one, and rows just before until into an unexpected bucket
+    first, last = -(-since // bucket), (until - grace) // bucket
+    expected = np.arange(first, last)
+    in_range = (present >= first) & (present < last)
+    present, rows_per_bucket = present[in_range], rows_per_bucket[in_range]
+    missing = np.setdiff1d(expected, present)
+
+    report = {
+        'endpoint': endpoint,
+        'table': cls.__tablename__,
+        'since': since,
+        'until': until,
+        'bucket_seconds': bucket,
+        'grace_seconds': grace,
+        'expected_buckets': len(expected),
+        'logged_buckets': len(present),
+        'missing_buckets': len(missing),
+        'missing_ranges': _ranges(missing, bucket),
+        'rows': int(ts_counts.sum()),
+    }
+
+    if len(present):
+        median = float(np.median(rows_per_bucket))
+        low = np.flatnonzero(rows_per_bucket < sparse * median)
+        report['rows_per_bucket'] = {
+            'min': int(rows_per_bucket.min()),
+            'median': median,
+            'max': int(rows_per_bucket.max()),
+        }
+        report['low_buckets'] = len(low)
+        report['low_bucket_rows'] = [
+            {
+                'timestamp': int(present[i]) * bucket,
+                'rows': int(rows_per_bucket[i])
+            } for i in low[:limit]
+        ]
+    else:
+        report['rows_per_bucket'] = None
+        report['low_buckets'] = 0
+        report['low_bucket_rows'] = []
+
+    # item coverage is relative to the logged buckets, so logger outages
+    # (reported as missing buckets) don't make every item sparse
+    coverage = np.minimum(id_counts / max(len(present), 1), 1)
+    sparse_idx = np.flatnonzero(coverage < sparse)
+    sparse_idx = sparse_idx[np.argsort(coverage[sparse_idx], kind='stable')]
+
+    report['items'] = len(ids)
+    report['sparse_items'] = len(sparse_idx)
+    report['sparse'] = [
+        {
+            'id': int(ids[i]),
+            'name': mappings.name(int(ids[i])) if mappings else None,
+            'rows': int(id_counts[i]),
+            'coverage': round(float(coverage[i]), 4),
+        } for i in sparse_idx[:limit]
+    ]
+    return report
+
+
+def coverage_report(
+    session: Session,
+    endpoints: Iterable[str] = ('latest', '5m', '1h'),
+    since: int | None = None,
+    until: int | None = None,
+    hours: float = 24,
+    **kwargs
+):
+    '''
+    Reports the coverage of each endpoint's logged prices (see
+    endpoint_coverage) between two timestamps, which default to the last
+    few hours
+    '''
+
+    until = int(time.time()) if until is None else until
+    since = int(until - hours * 60 * 60) if since is None else since
+    return [
+        endpoint_coverage(session, endpoint, since, until, **kwargs)
+        for endpoint in endpoints
+    ]
@@ -1,49 +1,121 @@
+import itertools
 import logging
 from datetime import datetime, timedelta
+from typing import Iterable
 
-from sqlalchemy import select, func, and_, false, Engine
+import sqlalchemy
+from sqlalchemy import select, func, and_, event, false, insert, Engine
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.orm import Session
-from tabulate import tabulate
 
-from .dbschema import Base, ItemInfo, LatestPrice, AvgFiveMinPrice, AvgHourPrice, format_timestamp
+from .dbschema import Base, ItemInfo, LatestPrice, AvgFiveMinPrice, AvgHourPrice, PriceAnomaly
+from .output import add_commas_to_rows, iter_commas, write_rows
+from .timestamps import get_formatter
 
 logger = logging.getLogger(__name__)
 
+# number of rows fetched from the database cursor at a time when streaming
+STREAM_BATCH_ROWS = 1000
+
+# PostgreSQL channel notified whenever prices are logged
+NOTIFY_CHANNEL = 'rsmarket_prices'
+
+PRICE_CLASSES = {
+    'latest': LatestPrice,
+    '5m': AvgFiveMinPrice,
+    '1h': AvgHourPrice,
+}
+
+# tuned for local analysis: concurrent readers during writes (WAL), fewer
+# fsyncs, and memory-mapped reads. page_size only applies to new databases
+SQLITE_PRAGMAS = {
+    'page_size': 8192,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def create_engine(engine_url: str, **kwargs) -> Engine:
+    '''
+    Creates a SQL engine. SQLite databases are given the embedded profile,
+    which applies SQLITE_PRAGMAS to every new connection.
+    '''
+
+    engine = sqlalchemy.create_engine(engine_url, **kwargs)
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _apply_sqlite_pragmas)
+    return engine
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {pragma} = {value}')
+    cursor.close()
+
 
 def initialize(mappings: dict, engine: Engine):
     '''Initialize database table schemas add item mappings'''
 
     try:
         Base.metadata.create_all(engine)
+
+        # create_all skips indexes of tables which already exist
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+
         with Session(engine) as session:
             # insert rows for missing item mappings (and avoid inserting duplicates)
             known_ids = set(
                 row.id for row in session.execute(select(ItemInfo.id)).all()
             )
-            items = [ItemInfo(**kwargs) for kwargs in mappings.values()]
-            items = [item for item in items if item.id not in known_ids]
-            session.add_all(items)
+            columns = ItemInfo.__table__.columns.keys()
+            items = [
+                {c: kwargs.get(c) for c in columns}
+                for kwargs in mappings.values()
+                if kwargs['id'] not in known_ids
+            ]
+            if items:
+                session.execute(insert(ItemInfo), items)
             session.commit()
     except IntegrityError:
         pass
 
 
+def prices_to_rows(prices: dict):
+    '''
+    Converts a prices dict (from an API endpoint) into a tuple of its
+    database class and a list of row dicts, suitable for bulk inserts
+    '''
+
+    cls = PRICE_CLASSES[prices['endpoint']]
+    timestamp = prices['timestamp']
+    columns = [
+        c for c in cls.__table__.columns.keys() if c not in ('id', 'timestamp')
+    ]
+
+    return cls, [
+        {'id': int(itemid), 'timestamp': timestamp}
+        | {c: kwargs.get(c) for c in columns}
+        for itemid, kwargs in prices['data'].items()
+    ]
+
+
 def prices_to_objects(
     prices: dict
 ) -> list[LatestPrice | AvgFiveMinPrice | AvgHourPrice]:
     '''Converts a prices dict (from an API endpoint) into a new list of database objects'''
 
-    classes = {
-        'latest': LatestPrice,
-        '5m': AvgFiveMinPrice,
-        '1h': AvgHourPrice,
-    }
-
     data = prices['data']
     timestamp = prices['timestamp']
     endpoint = prices['endpoint']
-    cls = classes[endpoint]
+    cls = PRICE_CLASSES[endpoint]
 
     return [
         cls(**kwargs, id=int(itemid), timestamp=timestamp)
@@ -51,35 +123,51 @@ def prices_to_objects(
     ]
 
 
-def convert_row_timestamps(rows, headers: list[str]):
+def iter_row_timestamps(rows, headers: list[str]):
     '''
-    Converts all UTC timestamps into datetime strings given a list of rows and
-    their headers. Any headers containing the case-insensitive string 'time'
-    will be converted.
+    Lazy version of convert_row_timestamps which converts and yields rows in
+    batches, so arbitrarily large results can be streamed
     '''
 
-    results = []
-    for row in rows:
-        tup = tuple(
-            format_timestamp(v) if 'time' in k.lower() else v
-            for k, v in zip(headers, row)
-        )
-        results.append(tup)
-    return results
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, STREAM_BATCH_ROWS)):
+        yield from convert_row_timestamps(batch, headers)
 
 
-def add_commas_to_rows(rows):
-    results = []
-    for row in rows:
-        tup = tuple(
-            f'{int(v):,}' if isinstance(v, (int, float)) else v for v in row
-        )
-        results.append(tup)
-    return results
+def convert_row_timestamps(rows, headers: list[str]):
+    '''
+    Converts all UTC timestamps into datetime strings given a list of rows and
+    their headers. Any headers containing the case-insensitive string 'time'
+    will be converted. Timestamp columns are resolved once, then each one is
+    converted in bulk.
+    '''
 
+    time_columns = [i for i, k in enumerate(headers) if 'time' in k.lower()]
+    if not rows or not time_columns:
+        return [tuple(row) for row in rows]
+
+    formatter = get_formatter()
+    columns = list(zip(*rows))
+    for i in time_columns:
+        values = columns[i]
+        if None in values:
+            known = [j for j, v in enumerate(values) if v is not None]
+            converted = list(values)
+            strings = formatter.format_array([values[j] for j in known])
+            for j, string in zip(known, strings):
+                converted[j] = string
+            columns[i] = converted
+        else:
+            columns[i] = formatter.format_array(values)
+    return list(zip(*columns))
+
+
+def latest_margins_query(ids: Iterable[int] | None = None):
+    '''
+    Returns a query of the highest and latest profit margins for all F2P items
 
-def latest_margins(session: Session):
-    '''Shows the highest and latest profit margins for all F2P items'''
+    :param ids: Only include these item ids (default: all items)
+    '''
 
     # use only use most recent prices
     ts_latest = select(func.max(LatestPrice.timestamp)).scalar_subquery()
@@ -97,7 +185,10 @@ def latest_margins(session: Session):
         .where(AvgHourPrice.timestamp > yesterday)  #
         .group_by(AvgHourPrice.id)  #
         .order_by(col_avgHourlyVolume.desc())  #
-    ).subquery()
+    )
+    if ids is not None:
+        q_avgHourlyVolume = q_avgHourlyVolume.where(AvgHourPrice.id.in_(ids))
+    q_avgHourlyVolume = q_avgHourlyVolume.subquery()
     dailyVolume = q_avgHourlyVolume.c.dailyVol
 
     margin = (LatestPrice.high - LatestPrice.low).label('margin')
@@ -143,20 +234,63 @@ def latest_margins(session: Session):
         .where(hourlyVolume * 24 > 10000)  #
         .order_by(profit.desc())  #
     )
+    if ids is not None:
+        query = query.where(LatestPrice.id.in_(ids))
+    return query
+
+
+def column_types(query):
+    '''Returns the python type of each column selected by a query (or None)'''
 
-    result = session.execute(query)
-    rows = result.all()
-    headers = list(result.keys())
-    rows = convert_row_timestamps(rows, headers)
-    rows = add_commas_to_rows(rows)
-    # print(tabulate(rows, headers=headers, stralign='right'))
+    types = []
+    for column in query.selected_columns:
+        try:
+            types.append(column.type.python_type)
+        except NotImplementedError:
+            types.append(None)
+    return types
+
+
+def stream_query(
+    session: Session, query, fmt: str = 'table', empty: str | None = None
+):
+    '''
+    Executes a query and streams its rows to stdout in the given format (see
+    output.write_rows) as they're fetched from the database cursor. Table
+    output is made human-readable by converting timestamps and adding commas.
+
+    :param empty: Message shown instead of an empty table (default: headers)
+    '''
+
+    result = session.execute(
+        query, execution_options={'yield_per': STREAM_BATCH_ROWS}
+    )
+    try:
+        headers = list(result.keys())
+        rows = iter(result)
+
+        if fmt == 'table':
+            if empty is not None:
+                first = next(rows, None)
+                if first is None:
+                    print(empty)
+                    return 0
+                rows = itertools.chain([first], rows)
+            rows = iter_commas(iter_row_timestamps(rows, headers))
 
-    if rows:
         # right-align all columns except the item name
         colalign = ['left' if h == 'name' else 'right' for h in headers]
-        print(tabulate(rows, headers=headers, colalign=colalign))
-    else:
-        print('No data to show')
+        return write_rows(
+            rows, headers, fmt, colalign=colalign, types=column_types(query)
+        )
+    finally:
+        result.close()
+
+
+def latest_margins(session: Session, fmt: str = 'table'):
+    '''Shows the highest and latest profit margins for all F2P items'''
+
+    stream_query(session, latest_margins_query(), fmt, 'No data to show')
 
 
 def count_24hr_samples(session: Session):
@@ -182,10 +316,10 @@ def log_prices_to_db(json_prices: dict, session: Session):
         row.id for row in session.execute(select(ItemInfo.id)).all()
     )
 
-    objs = prices_to_objects(json_prices)
-    objs = [obj for obj in objs if obj.id in known_ids]
+    cls, rows = prices_to_rows(json_prices)
+    rows = [row for row in rows if row['id'] in known_ids]
 
-    if not objs:
+    if not rows:
         logging.error(
             'Attempted to log an empty list of prices for endpoint "%s" at %s',
             json_prices['endpoint'], json_prices['timestamp']
@@ -193,12 +327,11 @@ def log_prices_to_db(json_prices: dict, session: Session):
         return False
 
     # check if logs already exist for this endpoint at the given time
-    obj = objs[0]
-    cls = obj.__class__
+    row = rows[0]
 
     res = session.execute(
         select(cls).where(
-            and_(cls.id == obj.id, cls.timestamp == obj.timestamp)
+            and_(cls.id == row['id'], cls.timestamp == row['timestamp'])
         )
     ).all()
 
@@ -209,5 +342,42 @@ def log_prices_to_db(json_prices: dict, session: Session):
         )
         return False
 
-    session.add_all(objs)
+    # a single executemany in one transaction (rather than one ORM object per
+    # row)
+    session.execute(insert(cls), rows)
+    session.commit()
+    return True
+
+
+def notify_prices(prices: dict, session: Session):
+    '''
+    Notifies listeners on NOTIFY_CHANNEL (ie: rsmarket watch) that new prices
+    have been logged. Requires PostgreSQL.
+    '''
+
+    payload = f"{prices['endpoint']}:{prices['timestamp']}"
+    session.execute(select(func.pg_notify(NOTIFY_CHANNEL, payload)))
     session.commit()
+
+
+def log_anomalies_to_db(anomalies: list, session: Session):
+    '''Logs a list of anomalies (from anomalies.StreamingStats) to the database'''
+
+    # remove invalid items which would cause foreign key constraints to fail
+    if anomalies:
+        known_ids = set(
+            row.id for row in session.execute(select(ItemInfo.id)).all()
+        )
+        anomalies = [a for a in anomalies if a.id in known_ids]
+
+    if not anomalies:
+        return False
+
+    try:
+        session.add_all(PriceAnomaly(**a._asdict()) for a in anomalies)
+        session.commit()
+    except Exception:
+        # leave the (shared) session usable for the next price log
+        session.rollback()
+        raise
+    return True
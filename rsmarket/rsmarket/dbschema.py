@@ -1,17 +1,7 @@
-from datetime import datetime
-
-from dateutil import tz
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
-
-def format_timestamp(timestamp: int, date_format='%b %d %Y %H:%M'):
-    '''Convert UTC timestamp to local datetime'''
-
-    utc = datetime.utcfromtimestamp(timestamp)
-    utc = utc.replace(tzinfo=tz.tzutc())
-    localtime = utc.astimezone(tz.tzlocal())
-    return localtime.strftime(date_format)
+from .timestamps import format_timestamp
 
 
 class Base(DeclarativeBase):
@@ -35,11 +25,15 @@ class ItemInfo(Base):
         return f'ItemMapping(id={self.id!r}, name={self.name!r})'
 
 
+# supports case-insensitive name lookups, ie: func.lower(ItemInfo.name) == ...
+Index('ix_mapping_lower_name', func.lower(ItemInfo.name))
+
+
 class LatestPrice(Base):
     __tablename__ = 'latest'
 
     id: Mapped[int] = mapped_column(ForeignKey('mapping.id'), primary_key=True)
-    timestamp: Mapped[int] = mapped_column(primary_key=True)
+    timestamp: Mapped[int] = mapped_column(primary_key=True, index=True)
     high: Mapped[int] = mapped_column(nullable=True)
     highTime: Mapped[int] = mapped_column(nullable=True)
     low: Mapped[int] = mapped_column(nullable=True)
@@ -57,7 +51,7 @@ class AvgHourPrice(Base):
     __tablename__ = 'onehour'
 
     id: Mapped[int] = mapped_column(ForeignKey('mapping.id'), primary_key=True)
-    timestamp: Mapped[int] = mapped_column(primary_key=True)
+    timestamp: Mapped[int] = mapped_column(primary_key=True, index=True)
     avgHighPrice: Mapped[int] = mapped_column(nullable=True)
     highPriceVolume: Mapped[int] = mapped_column(nullable=True)
     avgLowPrice: Mapped[int] = mapped_column(nullable=True)
@@ -73,7 +67,7 @@ class AvgFiveMinPrice(Base):
     __tablename__ = 'fivemin'
 
     id: Mapped[int] = mapped_column(ForeignKey('mapping.id'), primary_key=True)
-    timestamp: Mapped[int] = mapped_column(primary_key=True)
+    timestamp: Mapped[int] = mapped_column(primary_key=True, index=True)
     avgHighPrice: Mapped[int] = mapped_column(nullable=True)
     highPriceVolume: Mapped[int] = mapped_column(nullable=True)
     avgLowPrice: Mapped[int] = mapped_column(nullable=True)
@@ -83,3 +77,20 @@ class AvgFiveMinPrice(Base):
     def __repr__(self) -> str:
         timestamp = format_timestamp(self.timestamp)
         return f'AvgFiveMinPrice(id={self.id!r}, avgLowPrice={self.avgLowPrice}, avgHighPrice={self.avgHighPrice}, highPriceVolume={self.highPriceVolume}, lowPriceVolume={self.lowPriceVolume}, timestamp="{timestamp}")'
+
+
+class PriceAnomaly(Base):
+    __tablename__ = 'anomaly'
+
+    id: Mapped[int] = mapped_column(ForeignKey('mapping.id'), primary_key=True)
+    timestamp: Mapped[int] = mapped_column(primary_key=True)
+    endpoint: Mapped[str] = mapped_column(primary_key=True)
+    metric: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[float]
+    mean: Mapped[float]
+    zscore: Mapped[float]
+    mapping: Mapped[ItemInfo] = relationship()
+
+    def __repr__(self) -> str:
+        timestamp = format_timestamp(self.timestamp)
+        return f'PriceAnomaly(id={self.id!r}, endpoint={self.endpoint!r}, metric={self.metric!r}, value={self.value}, mean={self.mean}, zscore={self.zscore:.1f}, timestamp="{timestamp}")'
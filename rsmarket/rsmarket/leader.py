@@ -0,0 +1,202 @@
+import logging
+import os
+import zlib
+from pathlib import Path
+from typing import Callable, Iterable, Protocol
+
+from sqlalchemy import Engine, text
+
+logger = logging.getLogger(__name__)
+
+
+class Lock(Protocol):
+    '''A non-blocking, process-wide lock which is released if its holder dies'''
+
+    def try_acquire(self) -> bool:
+        ...
+
+    def is_held(self) -> bool:
+        ...
+
+    def release(self):
+        ...
+
+
+def lock_key(name: str):
+    '''Returns a stable integer key for a named advisory lock'''
+
+    return zlib.crc32(f'rsmarket:{name}'.encode())
+
+
+class AdvisoryLock:
+    '''
+    PostgreSQL session-level advisory lock, held on a dedicated connection.
+    The server releases the lock as soon as that connection is closed, ie:
+    when the holding process dies or loses its network connection.
+    '''
+
+    def __init__(self, engine: Engine, name: str):
+        self.engine = engine
+        self.name = name
+        self.key = lock_key(name)
+        self.conn = None
+
+    def try_acquire(self):
+        if self.is_held():
+            return True
+
+        conn = None
+        try:
+            conn = self.engine.connect().execution_options(
+                isolation_level='AUTOCOMMIT'
+            )
+            acquired = conn.execute(
+                text('SELECT pg_try_advisory_lock(:key)'), {'key': self.key}
+            ).scalar()
+        except Exception as exc:
+            logger.warning('Unable to acquire lock "%s": %s', self.name, exc)
+            if conn is not None:
+                conn.close()
+            return False
+
+        if acquired:
+            self.conn = conn
+        else:
+            conn.close()
+        return bool(acquired)
+
+    def is_held(self):
+        '''Returns whether the lock is still held, by checking that its connection is alive'''
+
+        if self.conn is None:
+            return False
+        try:
+            self.conn.execute(text('SELECT 1'))
+            return True
+        except Exception as exc:
+            logger.warning('Lost lock "%s": %s', self.name, exc)
+            self.conn.invalidate()
+            self.conn = None
+            return False
+
+    def release(self):
+        if self.conn is not None:
+            try:
+                self.conn.execute(
+                    text('SELECT pg_advisory_unlock(:key)'), {'key': self.key}
+                )
+            finally:
+                self.conn.close()
+                self.conn = None
+
+
+class FileLock:
+    '''
+    Advisory file lock (using flock) for coordinating logger processes on a
+    single host, ie: when using SQLite. The operating system releases the lock
+    when the holding process dies.
+    '''
+
+    def __init__(self, directory: str | os.PathLike, name: str):
+        self.name = name
+        self.path = Path(directory) / f'{name}.lock'
+        self.fd = None
+
+    def try_acquire(self):
+        import fcntl
+
+        if self.fd is not None:
+            return True
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def is_held(self):
+        return self.fd is not None
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def lock_factory(engine: Engine, lock_dir: str | os.PathLike):
+    '''
+    Returns a function which creates named locks suited to the engine's
+    database: advisory locks for PostgreSQL, or file locks for anything else
+    '''
+
+    if engine.dialect.name == 'postgresql':
+        return lambda name: AdvisoryLock(engine, name)
+    return lambda name: FileLock(lock_dir, name)
+
+
+class LeaderElector:
+    '''
+    Elects a single logging instance (the leader) among several, using one
+    lock per shard. Without sharding, one lock covers every endpoint.
+    Otherwise, each endpoint has its own lock, so different instances can
+    lead different endpoints.
+
+    Standby instances try to acquire the lock each time they would log, so
+    they take over within one logging interval once the leader dies.
+    '''
+
+    def __init__(
+        self,
+        make_lock: Callable[[str], Lock],
+        shard: bool = False,
+        prefer: Iterable[str] = ()
+    ):
+        '''
+        :param make_lock: Function which creates a lock from its name
+        :param shard: Whether to elect a separate leader for each endpoint
+        :param prefer: Endpoints whose locks are acquired immediately (when sharding)
+        '''
+
+        self.make_lock = make_lock
+        self.shard = shard
+        self.locks: dict[str, Lock] = {}
+
+        for endpoint in prefer if shard else ():
+            self.is_leader(endpoint)
+
+    def _lock(self, endpoint: str):
+        name = f'logger-{endpoint}' if self.shard else 'logger'
+        if name not in self.locks:
+            self.locks[name] = self.make_lock(name)
+        return self.locks[name]
+
+    def is_leader(self, endpoint: str):
+        '''Returns whether this instance leads the given endpoint, trying to become its leader if not'''
+
+        lock = self._lock(endpoint)
+        was_leader = lock.is_held()
+        leader = was_leader or lock.try_acquire()
+        if leader and not was_leader:
+            logger.info('Became the leader for %s prices', endpoint)
+        return leader
+
+    def release(self):
+        for lock in self.locks.values():
+            lock.release()
+
+
+def leader_only(
+    request_and_log: Callable[[str], bool], elector: LeaderElector
+):
+    '''Wraps a request_and_log function so it only logs while this instance leads the endpoint'''
+
+    def wrapper(endpoint: str):
+        if not elector.is_leader(endpoint):
+            logger.debug('Standing by: skipped logging %s prices', endpoint)
+            return False
+        return request_and_log(endpoint)
+
+    return wrapper
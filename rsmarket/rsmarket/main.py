@@ -1,23 +1,23 @@
 #!/usr/bin/env python3
 import argparse
+import functools
 import json
 import logging
 import os
 import signal
 import sys
 from pathlib import Path
-from typing import Any, Literal
+from typing import TYPE_CHECKING, Any, Iterator, Literal
 
-import requests
-from psycopg2.errors import InsufficientPrivilege
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError, ProgrammingError
-from tabulate import tabulate
+from . import api
 
-from . import api, db
-from . import logger as rslogger
+# database, numerical, and formatting libraries are imported by the
+# subcommands which use them, so commands like `rsmarket json` start quickly
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
+
+    from .cache import ItemMappings
+    from .recipes import RecipeIndex
 
 logging.basicConfig(
     level=os.getenv('LOGLEVEL', 'INFO').upper(),
@@ -25,6 +25,19 @@ logging.basicConfig(
 )
 
 
+@functools.cache
+def load_env():
+    '''Loads environment vars from .env and rsmarket-local.env (only once)'''
+
+    from dotenv import load_dotenv
+
+    # look for local .env if running in another directory (ie: examples)
+    load_dotenv(os.getcwd() + '/.env')
+
+    # look for the non-docker config
+    load_dotenv(Path(__file__).parent / '../../env/rsmarket-local.env')
+
+
 def get_engine():
     '''
     Configures and returns a SQL engine (using $DB_ENGINE_URL) after loadng
@@ -32,11 +45,9 @@ def get_engine():
     variable was not defined.
     '''
 
-    # look for local .env if running in another directory (ie: examples)
-    load_dotenv(os.getcwd() + '/.env')
+    from .db import create_engine
 
-    # look for the non-docker config
-    load_dotenv(Path(__file__).parent / '../../env/rsmarket-local.env')
+    load_env()
 
     if engine_url := os.getenv('DB_ENGINE_URL'):
         return create_engine(engine_url, echo=False)
@@ -46,16 +57,40 @@ def get_engine():
 
 
 def json_to_rows(data: dict):
-    '''Transform a prices dict into a CSV-like list of rows. The first row contains the column names'''
+    '''Transform a prices dict into a tuple of column names and a lazy iterator of CSV-like rows'''
 
     keys = sorted(set(key for info in data.values() for key in info))
-    rows: list[Any] = [
+    rows: Iterator[list[Any]] = (
         [int(item_id)] + list(map(item_data.get, keys))
         for item_id, item_data in data.items()
-    ]
+    )
     return ['id'] + keys, rows
 
 
+def add_format_argument(parser: argparse.ArgumentParser, default='table'):
+    parser.add_argument(
+        '-F',
+        '--format',
+        choices=['table', 'csv', 'jsonl', 'arrow'],
+        default=default,
+        help=f'Output format (default: {default})'
+    )
+
+
+def parse_time(value: str):
+    '''Parses a UTC timestamp or a date (in local time) into a UTC timestamp'''
+
+    if value.isdigit():
+        return int(value)
+
+    from dateutil import parser
+
+    try:
+        return int(parser.parse(value).timestamp())
+    except (ValueError, OverflowError):
+        raise argparse.ArgumentTypeError(f'invalid date: {value!r}')
+
+
 def get_parser():
     parser = argparse.ArgumentParser(prog='rsmarket')
     parser.add_argument(
@@ -92,6 +127,48 @@ def get_parser():
         action='store_true',
         help='Log current prices immediately'
     )
+    parser_log.add_argument(
+        '--shm',
+        metavar='NAME',
+        nargs='?',
+        const='rsmarket',
+        help='Publish recent 5m/1h prices to a shared memory block'
+    )
+    parser_log.add_argument(
+        '--shm-buckets',
+        type=int,
+        default=288,
+        help='Number of recent 5m/1h buckets kept in shared memory'
+    )
+    parser_log.add_argument(
+        '--ha',
+        action='store_true',
+        help='Run redundantly, where only the elected leader logs prices'
+    )
+    parser_log.add_argument(
+        '--shard',
+        action='store_true',
+        help='Elect a separate leader for each endpoint (requires --ha)'
+    )
+    parser_log.add_argument(
+        '--prefer',
+        nargs='+',
+        choices=['latest', '5m', '1h'],
+        default=[],
+        help='Endpoints to lead immediately when sharding'
+    )
+    parser_log.add_argument(
+        '-a',
+        '--anomalies',
+        action='store_true',
+        help='Track price/volume statistics and log anomalies'
+    )
+    parser_log.add_argument(
+        '--anomaly-threshold',
+        type=float,
+        default=4,
+        help='Minimum absolute z-score of logged anomalies'
+    )
 
     parser_json = subparsers.add_parser(
         'json', help='Dump raw JSON from API endpoints'
@@ -104,34 +181,562 @@ def get_parser():
     parser_json.add_argument(
         '-t',
         '--tabulate',
-        action='store_true',
-        help='Pretty-print tabular results'
+        action='store_const',
+        const='table',
+        dest='format',
+        help='Pretty-print tabular results (same as --format table)'
     )
+    add_format_argument(parser_json, default=None)
 
     parser_dbtest = subparsers.add_parser(
         'dbtest', help='Run various database tests'
     )
     db_subparsers = parser_dbtest.add_subparsers(dest='subcmd')
     db_subparsers.add_parser('count')
-    db_subparsers.add_parser('margins')
+    add_format_argument(db_subparsers.add_parser('margins'))
+
+    parser_watch = subparsers.add_parser(
+        'watch', help='Continuously show results as new prices are logged'
+    )
+    watch_subparsers = parser_watch.add_subparsers(
+        dest='subcmd', required=True
+    )
+    parser_watch_margins = watch_subparsers.add_parser(
+        'margins', help='Show the highest and latest profit margins'
+    )
+    parser_watch_margins.add_argument(
+        '-k',
+        '--top',
+        type=int,
+        default=20,
+        help='Number of items to show'
+    )
+    parser_watch_margins.add_argument(
+        '-i',
+        '--interval',
+        type=float,
+        default=10,
+        help='Seconds between checks for new prices'
+    )
+    parser_watch_margins.add_argument(
+        '--poll',
+        action='store_true',
+        help='Poll for new prices instead of listening for notifications'
+    )
+
+    parser_export = subparsers.add_parser(
+        'export', help='Stream logged prices from the database'
+    )
+    parser_export.add_argument(
+        'endpoint',
+        choices=['latest', '5m', '1h'],
+        help='Price history to export'
+    )
+    parser_export.add_argument(
+        '-H',
+        '--hours',
+        type=float,
+        help='Only export the last few hours of history'
+    )
+    add_format_argument(parser_export, default='csv')
+
+    parser_coverage = subparsers.add_parser(
+        'coverage',
+        help='Report missing buckets and sparse items in logged prices as JSON'
+    )
+    parser_coverage.add_argument(
+        'endpoints',
+        nargs='*',
+        metavar='{latest,5m,1h}',
+        help='Price histories to check (default: all)'
+    )
+    parser_coverage.add_argument(
+        '-H',
+        '--hours',
+        type=float,
+        default=24,
+        help='Number of hours to check (unless --since is given)'
+    )
+    parser_coverage.add_argument(
+        '--since',
+        type=parse_time,
+        help='Start of the time range, as a date or UTC timestamp'
+    )
+    parser_coverage.add_argument(
+        '--until',
+        type=parse_time,
+        help='End of the time range, as a date or UTC timestamp (default: now)'
+    )
+    parser_coverage.add_argument(
+        '-b',
+        '--bucket',
+        type=int,
+        help='Bucket size in seconds (default: the logging interval)'
+    )
+    parser_coverage.add_argument(
+        '-s',
+        '--sparse',
+        type=float,
+        default=0.5,
+        help='Items logged in fewer than this fraction of buckets are sparse'
+    )
+    parser_coverage.add_argument(
+        '-l',
+        '--limit',
+        type=int,
+        default=20,
+        help='Maximum number of sparse items and low buckets to list'
+    )
+    parser_coverage.add_argument(
+        '-g',
+        '--grace',
+        type=int,
+        default=60,
+        help='Seconds after a bucket ends before it must be logged'
+    )
+
+    parser_percentiles = subparsers.add_parser(
+        'percentiles',
+        help='Show volume-weighted price percentiles for all items'
+    )
+    parser_percentiles.add_argument(
+        'items',
+        nargs='*',
+        help='Only show items with these names (case-insensitive)'
+    )
+    parser_percentiles.add_argument(
+        '-e',
+        '--endpoint',
+        choices=['5m', '1h'],
+        default='5m',
+        help='Price history to use'
+    )
+    parser_percentiles.add_argument(
+        '-H',
+        '--hours',
+        type=float,
+        default=24,
+        help='Number of hours of history to use'
+    )
+    parser_percentiles.add_argument(
+        '-p',
+        '--percentiles',
+        type=int,
+        nargs='+',
+        help='Percentiles to compute (default: 0 5 10 25)'
+    )
+    parser_percentiles.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Recompute percentiles instead of using cached results'
+    )
+
+    parser_recipes = subparsers.add_parser(
+        'recipes', help='Show the most profitable item recipes'
+    )
+    parser_recipes.add_argument(
+        '-n',
+        '--limit',
+        type=int,
+        default=25,
+        help='Number of recipes to show'
+    )
+    parser_recipes.add_argument(
+        '-i',
+        '--instant',
+        action='store_true',
+        help='Instantly buy inputs and sell outputs instead of using offers'
+    )
+    parser_recipes.add_argument(
+        '-m',
+        '--min-volume',
+        type=int,
+        default=0,
+        help='Minimum number of recipes which can be made per day'
+    )
+
+    parser_recent = subparsers.add_parser(
+        'recent',
+        help='Show recent prices from the logger\'s shared memory block'
+    )
+    parser_recent.add_argument('item', help='Item name (case-insensitive)')
+    parser_recent.add_argument(
+        '-e',
+        '--endpoint',
+        choices=['5m', '1h'],
+        default='5m',
+        help='Price history to show'
+    )
+    parser_recent.add_argument(
+        '--shm',
+        metavar='NAME',
+        default='rsmarket',
+        help='Name of the shared memory block'
+    )
+
+    parser_backtest = subparsers.add_parser(
+        'backtest', help='Backtest flipping strategies on logged prices'
+    )
+    parser_backtest.add_argument(
+        '-e',
+        '--endpoint',
+        choices=['5m', '1h'],
+        default='1h',
+        help='Price history to use'
+    )
+    parser_backtest.add_argument(
+        '-d',
+        '--days',
+        type=float,
+        default=7,
+        help='Number of days of history to use'
+    )
+    parser_backtest.add_argument(
+        '-H',
+        '--hold',
+        type=float,
+        nargs='+',
+        default=[1],
+        help='Hours between buying and selling (multiple values are swept)'
+    )
+    parser_backtest.add_argument(
+        '-V',
+        '--volume-frac',
+        type=float,
+        nargs='+',
+        default=[0.1],
+        help='Fraction of traded volume our offers can fill'
+    )
+    parser_backtest.add_argument(
+        '-m',
+        '--min-margin',
+        type=float,
+        nargs='+',
+        default=[1],
+        help='Minimum post-tax margin required to buy an item'
+    )
+    parser_backtest.add_argument(
+        '-n',
+        '--limit',
+        type=int,
+        default=10,
+        help='Number of items to show for the best strategy'
+    )
+    parser_backtest.add_argument(
+        '-j',
+        '--processes',
+        type=int,
+        help='Number of worker processes (default: number of CPUs)'
+    )
+
+    parser_search = subparsers.add_parser(
+        'search', help='Search for items by name'
+    )
+    parser_search.add_argument(
+        'query', help='Full, partial, or misspelled item name'
+    )
+    parser_search.add_argument(
+        '-n',
+        '--limit',
+        type=int,
+        default=10,
+        help='Maximum number of results'
+    )
 
     return parser
 
 
-def price_logger_factory(session: Session):
-    '''Returns a function which requests API prices and logs them to the given database engine'''
+def get_data_dir():
+    '''Returns the directory where mappings, recipes, and caches are stored'''
+
+    data_dir = Path(os.getenv('DATA_DIR', Path(__file__).parent / 'data'))
+    data_dir.mkdir(exist_ok=True)
+    return data_dir
+
+
+def price_logger_factory(session: 'Session', callbacks=()):
+    '''
+    Returns a function which requests API prices and logs them to the given
+    database engine. Each callback is called with the prices dict after it has
+    been successfully logged.
+    '''
+
+    import requests
+
+    from . import db
 
     def request_and_log(endpoint: Literal['latest', '5m', '1h']):
         try:
             prices = api.request(endpoint)
-            return db.log_prices_to_db(prices, session=session)
+            if not db.log_prices_to_db(prices, session=session):
+                return False
         except requests.RequestException:
             logging.exception('Error requesting prices')
             return False
 
+        for callback in callbacks:
+            try:
+                callback(prices)
+            except Exception:
+                logging.exception('Error in price log callback')
+                session.rollback()
+        return True
+
     return request_and_log
 
 
+def anomaly_logger_factory(
+    session: 'Session', state_file: Path, threshold: float
+):
+    '''
+    Returns a price log callback which updates streaming price statistics
+    (persisted to state_file) and logs any anomalies to the database
+    '''
+
+    from . import db
+    from .anomalies import StreamingStats
+
+    stats = StreamingStats.load(state_file, threshold=threshold)
+
+    def update(prices: dict):
+        anomalies = stats.update(prices)
+        stats.save(state_file)
+        for a in anomalies:
+            logging.info(
+                'Anomaly in %s %s of item %d: %g (mean %g, z=%.1f)',
+                a.endpoint, a.metric, a.id, a.value, a.mean, a.zscore
+            )
+        db.log_anomalies_to_db(anomalies, session)
+
+    return update
+
+
+def show_percentiles(
+    args: argparse.Namespace,
+    session: 'Session',
+    mappings: 'ItemMappings',
+    cache_dir: Path,
+):
+    '''Prints volume-weighted price percentiles for all (or the given) items'''
+
+    from tabulate import tabulate
+
+    from . import db, percentiles
+
+    if not args.percentiles:
+        args.percentiles = list(percentiles.DEFAULT_PERCENTILES)
+
+    if args.no_cache:
+        results = percentiles.volume_percentiles(
+            session, args.endpoint, args.hours, args.percentiles
+        )
+    else:
+        results = percentiles.cached_volume_percentiles(
+            session, cache_dir, args.endpoint, args.hours, args.percentiles
+        )
+
+    names = {name.lower() for name in args.items}
+    headers = ['name'] + [
+        f'{side} {p}%' for side in percentiles.SIDES for p in args.percentiles
+    ]
+    rows = []
+    for item_id, sides in results.items():
+        name = mappings.name(item_id, str(item_id))
+        if names and name.lower() not in names:
+            continue
+        empty = [None] * len(args.percentiles)
+        rows.append(
+            [name]
+            + [v for side in percentiles.SIDES for v in sides.get(side, empty)]
+        )
+    rows.sort(key=lambda row: row[0])
+
+    if rows:
+        colalign = ['left'] + ['right'] * (len(headers) - 1)
+        print(
+            tabulate(
+                db.add_commas_to_rows(rows),
+                headers=headers,
+                colalign=colalign
+            )
+        )
+    else:
+        print('No data to show')
+
+
+def show_recipes(
+    args: argparse.Namespace, session: 'Session', index: 'RecipeIndex'
+):
+    '''Prints the most profitable recipes based on the latest logged prices'''
+
+    import numpy as np
+    from tabulate import tabulate
+
+    from . import db
+    from . import recipes as rsrecipes
+
+    results = rsrecipes.recipe_margins(session, index, instant=args.instant)
+
+    margin = results['margin']
+    keep = ~np.isnan(margin) & (results['volume'] >= args.min_volume)
+    order = [i for i in np.argsort(-margin) if keep[i]][:args.limit]
+
+    headers = ['margin', 'cost', 'revenue', 'tax', 'volume', 'name']
+    rows = [
+        [results[h][i] for h in headers[:-1]] + [index.names[i]]
+        for i in order
+    ]
+
+    if rows:
+        colalign = ['left' if h == 'name' else 'right' for h in headers]
+        print(
+            tabulate(
+                db.add_commas_to_rows(rows),
+                headers=headers,
+                colalign=colalign
+            )
+        )
+    else:
+        print('No data to show')
+
+
+def show_recent(args: argparse.Namespace, mappings: 'ItemMappings'):
+    '''Prints an item's recent prices from the logger's shared memory block'''
+
+    from tabulate import tabulate
+
+    from .names import NameIndex
+    from .output import add_commas_to_rows
+    from .timeseries import FIELDS, RollingStore
+    from .timestamps import format_timestamp
+
+    if not (ids := NameIndex(mappings).find(args.item)):
+        print(f'Unknown item: {args.item}')
+        return False
+
+    try:
+        store = RollingStore.attach(args.shm)
+    except FileNotFoundError:
+        print(f'No prices are being published to "{args.shm}" (see log --shm)')
+        return False
+
+    with store:
+        timestamps, values = store.history(args.endpoint, ids[:1])
+
+    rows = [
+        [format_timestamp(ts)] + [
+            None if (v := values[f][0, i]) < 0 else int(v) for f in FIELDS
+        ] for i, ts in enumerate(timestamps.tolist())
+    ]
+    if rows:
+        print(
+            tabulate(
+                add_commas_to_rows(rows),
+                headers=['timestamp', *FIELDS],
+                stralign='right'
+            )
+        )
+    else:
+        print('No data to show')
+
+
+def show_backtest(
+    args: argparse.Namespace, session: 'Session', mappings: 'ItemMappings'
+):
+    '''Backtests a grid of strategy parameters and prints their results'''
+
+    import itertools
+
+    import numpy as np
+    from tabulate import tabulate
+
+    from . import db
+    from .backtest import Strategy, load_history, sweep
+
+    history = load_history(session, args.endpoint, args.days)
+    if not len(history.timestamps):
+        print('No data to show')
+        return
+
+    strategies = [
+        Strategy(hold, frac, margin) for hold, frac, margin in
+        itertools.product(args.hold, args.volume_frac, args.min_margin)
+    ]
+    results = sweep(history, strategies, args.processes)
+
+    headers = [
+        'hold', 'volFrac', 'minMargin', 'pnl', 'trades', 'fillRate',
+        'drawdown'
+    ]
+    rows = [
+        [
+            s.hold_hours, s.volume_frac, s.min_margin,
+            int(r['pnl'].sum()),
+            int(r['trades'].sum()),
+            f"{r['fill_rate'][r['trades'] > 0].mean():.1%}"
+            if r['trades'].any() else '-',
+            int(r['portfolio_drawdown'])
+        ] for s, r in zip(strategies, results)
+    ]
+    print(tabulate(rows, headers=headers, floatfmt='g'))
+
+    best = max(range(len(results)), key=lambda i: results[i]['pnl'].sum())
+    r = results[best]
+    print(f'\nTop items for strategy: {strategies[best]}\n')
+    headers = ['pnl', 'trades', 'fillRate', 'sellRate', 'drawdown', 'name']
+    rows = [
+        [
+            int(r['pnl'][i]),
+            int(r['trades'][i]),
+            f"{r['fill_rate'][i]:.1%}",
+            f"{r['sell_rate'][i]:.1%}",
+            int(r['drawdown'][i]),
+            mappings.name(history.item_ids[i])
+        ] for i in np.argsort(-r['pnl'])[:args.limit]
+    ]
+    colalign = ['left' if h == 'name' else 'right' for h in headers]
+    print(
+        tabulate(
+            db.add_commas_to_rows(rows), headers=headers, colalign=colalign
+        )
+    )
+
+
+def show_search(args: argparse.Namespace, mappings: 'ItemMappings'):
+    '''Prints items whose names match the search query'''
+
+    from tabulate import tabulate
+
+    from .names import NameIndex
+
+    headers = ['id', 'name', 'members', 'limit', 'value']
+    rows = [
+        [mappings[str(item_id)].get(h) for h in headers]
+        for item_id in NameIndex(mappings).search(args.query, args.limit)
+    ]
+    if rows:
+        print(tabulate(rows, headers=headers))
+    else:
+        print('No items found')
+
+
+def export_prices(args: argparse.Namespace, session: 'Session'):
+    '''Streams an endpoint's logged prices to stdout in the chosen format'''
+
+    from sqlalchemy import func, select
+
+    from . import db
+    from .dbschema import AvgFiveMinPrice, AvgHourPrice, LatestPrice
+
+    cls = {'latest': LatestPrice, '5m': AvgFiveMinPrice, '1h': AvgHourPrice}
+    table = cls[args.endpoint].__table__
+    query = select(table).order_by(table.c.timestamp, table.c.id)
+    if args.hours is not None:
+        ts_max = select(func.max(table.c.timestamp)).scalar_subquery()
+        query = query.where(table.c.timestamp > ts_max - args.hours * 60 * 60)
+    db.stream_query(session, query, args.format)
+
+
 def _main():
     parser = get_parser()
     args = parser.parse_args()
@@ -139,23 +744,49 @@ def _main():
     if args.verbose:
         os.environ['VERBOSE'] = '1'
 
+    if args.cmd == 'log' and not args.ha and (args.shard or args.prefer):
+        parser.error('--shard and --prefer require --ha')
+
+    # validated here, since argparse rejects nargs='*' defaults with choices
+    if args.cmd == 'coverage':
+        endpoints = ['latest', '5m', '1h']
+        if invalid := [e for e in args.endpoints if e not in endpoints]:
+            parser.error(f'invalid endpoint: {invalid[0]!r}')
+        args.endpoints = args.endpoints or endpoints
+
+    if getattr(args, 'format', None) == 'arrow':
+        import importlib.util
+        if not importlib.util.find_spec('pyarrow'):
+            logging.error('The arrow format requires pyarrow')
+            return False
+
     if args.cmd == 'json':
         prices = api.request(args.endpoint)
-        if args.tabulate:
+        if args.format:
+            from .output import write_rows
             headers, rows = json_to_rows(prices['data'])
-            print(tabulate(rows, headers=headers))
+            write_rows(rows, headers, args.format)
         else:
             print(json.dumps(prices, indent=2))
         return
 
+    if args.cmd in ('recent', 'search'):
+        mappings = api.load_mappings(get_data_dir() / 'mappings.json')
+        if args.cmd == 'search':
+            return show_search(args, mappings)
+        return show_recent(args, mappings)
+
     if not (engine := get_engine()):
         return False
 
-    # ensure data directory exists and mappings/recipes have been downloaded
-    DATA_DIR = Path(os.getenv('DATA_DIR', Path(__file__).parent / 'data'))
-    DATA_DIR.mkdir(exist_ok=True)
+    from sqlalchemy.orm import Session
+
+    from . import db
+    from . import logger as rslogger
+
+    # ensure data directory exists and mappings have been downloaded
+    DATA_DIR = get_data_dir()
     mappings = api.load_mappings(DATA_DIR / 'mappings.json')
-    recipes = api.load_recipes(DATA_DIR / 'recipes.json')
 
     session = Session(engine)
 
@@ -165,41 +796,127 @@ def _main():
             'Are you sure you want to begin logging? [y/N] '
         ).lower() != 'y':
             return
-        request_and_log = price_logger_factory(session)
-        rslogger.loop(
-            request_and_log,
-            log_now=args.now,
-            enable_1h_interval=not args.disable_1h,
-            enable_5m_interval=not args.disable_5m
-        )
+        callbacks = []
+        if args.shm:
+            from .timeseries import RollingStore
+            store = RollingStore.create(
+                map(int, mappings), args.shm_buckets, args.shm
+            )
+            store.backfill(session)
+            callbacks.append(store.append)
+
+        if args.anomalies:
+            callbacks.append(
+                anomaly_logger_factory(
+                    session, DATA_DIR / 'stats.npz', args.anomaly_threshold
+                )
+            )
+
+        if engine.dialect.name == 'postgresql':
+            callbacks.append(
+                functools.partial(db.notify_prices, session=session)
+            )
+
+        request_and_log = price_logger_factory(session, callbacks)
+        if args.ha:
+            from .leader import LeaderElector, leader_only, lock_factory
+            elector = LeaderElector(
+                lock_factory(engine, DATA_DIR), args.shard, args.prefer
+            )
+            request_and_log = leader_only(request_and_log, elector)
+
+        try:
+            rslogger.loop(
+                request_and_log,
+                log_now=args.now,
+                enable_1h_interval=not args.disable_1h,
+                enable_5m_interval=not args.disable_5m
+            )
+        finally:
+            if args.shm:
+                store.close()
+            if args.ha:
+                elector.release()
 
     elif args.cmd == 'dbtest':
         match args.subcmd:
             case 'count':
                 db.count_24hr_samples(session)
             case 'margins':
-                db.latest_margins(session)
+                db.latest_margins(session, args.format)
             case _:
                 db.latest_margins(session)
 
+    elif args.cmd == 'watch':
+        from .watch import watch_margins
+        watch_margins(engine, args.top, args.interval, listen=not args.poll)
+
+    elif args.cmd == 'export':
+        export_prices(args, session)
+
+    elif args.cmd == 'coverage':
+        from .coverage import coverage_report
+        report = coverage_report(
+            session,
+            args.endpoints,
+            args.since,
+            args.until,
+            args.hours,
+            bucket=args.bucket,
+            sparse=args.sparse,
+            limit=args.limit,
+            grace=args.grace,
+            mappings=mappings
+        )
+        print(json.dumps(report, indent=2))
+
+    elif args.cmd == 'percentiles':
+        show_percentiles(args, session, mappings, DATA_DIR / 'cache')
+
+    elif args.cmd == 'recipes':
+        index = api.load_recipe_index(DATA_DIR / 'recipes.json')
+        show_recipes(args, session, index)
+
+    elif args.cmd == 'backtest':
+        show_backtest(args, session, mappings)
+
     else:
         parser.print_help()
 
 
+def db_errors() -> tuple[type[Exception], ...]:
+    '''
+    Returns the database exceptions which are reported without a traceback.
+    Only exceptions from already imported modules are included, since no
+    other database errors could have been raised.
+    '''
+
+    errors = []
+    if 'sqlalchemy' in sys.modules:
+        from sqlalchemy.exc import OperationalError, ProgrammingError
+        errors += [OperationalError, ProgrammingError]
+    if 'psycopg2' in sys.modules:
+        from psycopg2.errors import InsufficientPrivilege
+        errors.append(InsufficientPrivilege)
+    return tuple(errors)
+
+
 def main():
     # shutdown gracefully when Docker sends SIGTERM
     signal.signal(signal.SIGTERM, lambda s, f: sys.exit(0))
 
     try:
         return _main()
-    except (ProgrammingError, InsufficientPrivilege, OperationalError) as exc:
+    except (KeyboardInterrupt, BrokenPipeError, SystemExit):
+        pass
+    except Exception as exc:
+        if not isinstance(exc, db_errors()):
+            raise
         if os.getenv('VERBOSE', '0').lower() in ('0', 'false'):
             logging.error('For a full traceback, use -v or set VERBOSE=1')
             logging.error(str(exc.args[0]).strip())
         else:
             logging.exception(exc)
-    except (KeyboardInterrupt, BrokenPipeError, SystemExit):
-        pass
 
 
 if __name__ == '__main__':
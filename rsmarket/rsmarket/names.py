@@ -0,0 +1,112 @@
+import bisect
+from collections import Counter, defaultdict
+from functools import cached_property
+
+from .cache import ItemMappings
+
+
+def _trigrams(text: str):
+    '''Returns the set of character trigrams of a padded, lowercase string'''
+
+    text = f'  {text.lower()} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    '''
+    In-memory index of item names supporting exact, prefix, and fuzzy
+    (trigram similarity) searches. All searches are case-insensitive.
+    '''
+
+    def __init__(self, mappings: ItemMappings | dict):
+        '''
+        :param mappings: Item mappings (from api.load_mappings)
+        '''
+
+        # read names from the columns, without building each item's info dict
+        if isinstance(mappings, ItemMappings):
+            pairs = zip(mappings.ids, mappings.strings['name'])
+        else:
+            pairs = ((item_id, info['name'])
+                     for item_id, info in mappings.items())
+        self.names: dict[int, str] = {int(i): name for i, name in pairs}
+
+        self.exact: dict[str, list[int]] = defaultdict(list)
+        for item_id, name in self.names.items():
+            self.exact[name.lower()].append(item_id)
+
+        # sorted (name, id) pairs for binary searching prefixes
+        self.sorted = sorted(
+            (name.lower(), item_id) for item_id, name in self.names.items()
+        )
+        self.keys = [name for name, _ in self.sorted]
+
+    @cached_property
+    def trigrams(self):
+        '''
+        Returns a tuple of ({trigram: item ids}, {item id: trigram count}),
+        which is only built once a fuzzy search needs it
+        '''
+
+        postings: dict[str, list[int]] = defaultdict(list)
+        sizes: dict[int, int] = {}
+        for item_id, name in self.names.items():
+            grams = _trigrams(name)
+            sizes[item_id] = len(grams)
+            for gram in grams:
+                postings[gram].append(item_id)
+        return postings, sizes
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, name: str):
+        '''Returns the ids of all items with the given name'''
+
+        return list(self.exact.get(name.lower(), []))
+
+    def prefix(self, prefix: str, limit: int | None = None):
+        '''Returns the ids of items whose names start with prefix, in alphabetical order'''
+
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.keys, prefix)
+        results = []
+        for name, item_id in self.sorted[start:]:
+            if not name.startswith(prefix) or len(results) == limit:
+                break
+            results.append(item_id)
+        return results
+
+    def fuzzy(self, query: str, limit: int = 10, min_score: float = 0.3):
+        '''
+        Returns (id, score) pairs of the items whose names are most similar to
+        the query, using the Dice coefficient of their trigram sets
+        '''
+
+        postings, sizes = self.trigrams
+        grams = _trigrams(query)
+        shared = Counter(
+            item_id for gram in grams for item_id in postings.get(gram, ())
+        )
+        scored = [
+            (item_id, 2 * n / (len(grams) + sizes[item_id]))
+            for item_id, n in shared.items()
+        ]
+        scored = [(i, score) for i, score in scored if score >= min_score]
+        scored.sort(key=lambda pair: (-pair[1], self.names[pair[0]]))
+        return scored[:limit]
+
+    def search(self, query: str, limit: int = 10):
+        '''
+        Returns the ids of items matching the query, ordered by exact matches,
+        then prefix matches, then fuzzy matches
+        '''
+
+        results = self.find(query)
+        for item_id in self.prefix(query, limit):
+            if item_id not in results:
+                results.append(item_id)
+        for item_id, _ in self.fuzzy(query, limit):
+            if item_id not in results:
+                results.append(item_id)
+        return results[:limit]
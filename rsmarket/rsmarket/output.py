@@ -0,0 +1,195 @@
+import csv
+import itertools
+import json
+import sys
+from typing import IO, Any, Iterable, Sequence
+
+FORMATS = ('table', 'csv', 'jsonl', 'arrow')
+
+# number of rows buffered to determine column widths in table mode
+TABLE_SAMPLE_ROWS = 100
+
+# number of rows per record batch in arrow mode
+ARROW_BATCH_ROWS = 10_000
+
+# arrow types of python column types (see write_arrow)
+ARROW_TYPES = {
+    bool: 'bool_',
+    int: 'int64',
+    float: 'float64',
+    str: 'string',
+}
+
+
+def iter_commas(rows):
+    '''Lazy version of add_commas_to_rows which yields converted rows'''
+
+    for row in rows:
+        yield tuple(
+            f'{int(v):,}' if isinstance(v, (int, float)) else v for v in row
+        )
+
+
+def add_commas_to_rows(rows):
+    return list(iter_commas(rows))
+
+
+def write_table(
+    rows: Iterable[Sequence[Any]],
+    headers: Sequence[str],
+    out: IO[str],
+    colalign: Sequence[str] | None = None,
+    sample: int = TABLE_SAMPLE_ROWS
+):
+    '''
+    Writes rows as a plain text table, similar to tabulate's default format.
+    Column widths are determined from the first sample rows only, so the
+    remaining rows are streamed without being held in memory (wider values
+    are written in full, misaligning their row).
+
+    :param colalign: Alignment of each column, either 'left' or 'right' (default: numbers are right-aligned)
+    '''
+
+    rows = iter(rows)
+    sampled = list(itertools.islice(rows, sample))
+
+    if colalign is None:
+        colalign = [
+            'right' if sampled and all(
+                row[i] is None or isinstance(row[i], (int, float))
+                for row in sampled
+            ) else 'left' for i in range(len(headers))
+        ]
+
+    head = [['' if v is None else str(v) for v in row] for row in sampled]
+    widths = [
+        max([len(h)] + [len(row[i]) for row in head])
+        for i, h in enumerate(headers)
+    ]
+
+    def format_row(values):
+        return '  '.join(
+            v.rjust(w) if align == 'right' else v.ljust(w)
+            for v, w, align in zip(values, widths, colalign)
+        ).rstrip()
+
+    out.write(format_row(headers) + '\n')
+    out.write('  '.join('-' * w for w in widths) + '\n')
+    for row in head:
+        out.write(format_row(row) + '\n')
+    for row in rows:
+        values = ['' if v is None else str(v) for v in row]
+        out.write(format_row(values) + '\n')
+
+
+def write_arrow(
+    rows: Iterable[Sequence[Any]],
+    headers: Sequence[str],
+    out=None,
+    batch_rows: int = ARROW_BATCH_ROWS,
+    types: Sequence[type | None] | None = None
+):
+    '''
+    Writes rows as an Arrow IPC stream of record batches (requires pyarrow).
+    The type of each column without a known python type is inferred from its
+    values. Batches are buffered until every column has a non-null value, so
+    a column which is empty in the first batch doesn't get the null type.
+
+    :param types: Python type of each column (ie: int), or None if unknown
+    '''
+
+    import pyarrow as pa
+
+    out = out or sys.stdout.buffer
+    rows = iter(rows)
+    arrow_types = [
+        getattr(pa, ARROW_TYPES[t])() if t in ARROW_TYPES else None
+        for t in types or [None] * len(headers)
+    ]
+
+    writer = schema = None
+    pending = []
+
+    def write(columns):
+        writer.write_batch(
+            pa.record_batch(
+                [
+                    pa.array(col, type=field.type)
+                    for col, field in zip(columns, schema)
+                ],
+                schema=schema
+            )
+        )
+
+    while batch := list(itertools.islice(rows, batch_rows)):
+        columns = [list(col) for col in zip(*batch)]
+        if writer is not None:
+            write(columns)
+            continue
+
+        for i, col in enumerate(columns):
+            if arrow_types[i] is None and any(v is not None for v in col):
+                arrow_types[i] = pa.array(col).type
+        pending.append(columns)
+        if None not in arrow_types:
+            schema = pa.schema(list(zip(headers, arrow_types)))
+            writer = pa.ipc.new_stream(out, schema)
+            for columns in pending:
+                write(columns)
+            pending = []
+
+    # columns which never had a value keep the null type
+    if writer is None:
+        schema = pa.schema(
+            [(h, t or pa.null()) for h, t in zip(headers, arrow_types)]
+        )
+        writer = pa.ipc.new_stream(out, schema)
+        for columns in pending:
+            write(columns)
+    writer.close()
+
+
+def write_rows(
+    rows: Iterable[Sequence[Any]],
+    headers: Sequence[str],
+    fmt: str = 'table',
+    out: IO[str] | None = None,
+    colalign: Sequence[str] | None = None,
+    types: Sequence[type | None] | None = None
+):
+    '''
+    Streams rows to stdout (or out) in the given format as they're produced,
+    without holding the full result set in memory. Returns the number of rows
+    written.
+
+    :param fmt: Output format, one of: table, csv, jsonl, or arrow
+    :param colalign: Column alignments for the table format
+    :param types: Python type of each column, used by the arrow format
+    '''
+
+    out = out or sys.stdout
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    match fmt:
+        case 'table':
+            write_table(counted(rows), headers, out, colalign)
+        case 'csv':
+            writer = csv.writer(out)
+            writer.writerow(headers)
+            writer.writerows(counted(rows))
+        case 'jsonl':
+            for row in counted(rows):
+                out.write(json.dumps(dict(zip(headers, row)), default=str))
+                out.write('\n')
+        case 'arrow':
+            out.flush()
+            write_arrow(counted(rows), headers, types=types)
+        case _:
+            raise ValueError(f'Unknown output format: {fmt}')
+    return count
@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from .dbschema import AvgFiveMinPrice, AvgHourPrice
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERCENTILES = (0, 5, 10, 25)
+
+# (price column, volume column, sort descending) for each side of the market.
+# instabuys are ranked from the highest price down, instasells from the lowest
+# price up
+SIDES = {
+    'instabuy': ('avgHighPrice', 'highPriceVolume', True),
+    'instasell': ('avgLowPrice', 'lowPriceVolume', False),
+}
+
+
+def _side_percentiles(
+    ids: np.ndarray, prices: np.ndarray, volumes: np.ndarray,
+    fractions: np.ndarray, descending: bool
+):
+    '''
+    Computes volume-weighted price percentiles for every item in a single
+    vectorized pass. Returns a tuple of (unique item ids, percentile prices)
+    where the prices array has one row per item and one column per fraction.
+    '''
+
+    valid = ~np.isnan(prices) & ~np.isnan(volumes) & (volumes > 0)
+    ids, prices, volumes = ids[valid], prices[valid], volumes[valid]
+    if not len(ids):
+        return ids, np.empty((0, len(fractions)))
+
+    # group rows by item, then order each group by price
+    order = np.lexsort((-prices if descending else prices, ids))
+    ids, prices, volumes = ids[order], prices[order], volumes[order]
+
+    unique_ids, starts, counts = np.unique(
+        ids, return_index=True, return_counts=True
+    )
+    group = np.repeat(np.arange(len(unique_ids)), counts)
+
+    # cumulative volume fraction within each item's group
+    cumsum = np.cumsum(volumes)
+    offsets = np.concatenate(([0], cumsum[starts[1:] - 1]))
+    totals = np.add.reduceat(volumes, starts)
+    fraction = (cumsum - offsets[group]) / totals[group]
+
+    # fractions lie in (0, 1], so shifting each group by 2 * its index yields
+    # a globally sorted key which can be searched for all items at once
+    key = 2 * group + fraction
+    targets = 2 * np.arange(len(unique_ids))[:, None] + fractions[None, :]
+    idx = np.searchsorted(key, targets, side='left')
+
+    # guard against rounding errors in the final cumulative fraction
+    idx = np.minimum(idx, (starts + counts - 1)[:, None])
+    return unique_ids, prices[idx]
+
+
+def volume_percentiles(
+    session: Session,
+    endpoint: str = '5m',
+    hours: float = 24,
+    percentiles=DEFAULT_PERCENTILES,
+    end: int | None = None
+):
+    '''
+    Returns a dict of item ids mapped to their volume-weighted instabuy and
+    instasell price percentiles over the given time window, ie:
+    {id: {'instabuy': [...], 'instasell': [...]}}
+
+    :param endpoint: Price history to use, one of: 5m or 1h
+    :param hours: Size of the time window preceding the end timestamp
+    :param percentiles: Percentiles to compute, from 0 (best price) to 100
+    :param end: Last timestamp of the window (defaults to the latest logged timestamp)
+    '''
+
+    cls = {'5m': AvgFiveMinPrice, '1h': AvgHourPrice}[endpoint]
+    if end is None:
+        end = session.execute(select(func.max(cls.timestamp))).scalar()
+        if end is None:
+            return {}
+
+    columns = [
+        getattr(cls, col) for price, volume, _ in SIDES.values()
+        for col in (price, volume)
+    ]
+    query = (
+        select(cls.id, *columns)  #
+        .where(cls.timestamp > end - hours * 60 * 60)  #
+        .where(cls.timestamp <= end)  #
+    )
+    rows = session.execute(query).all()
+    if not rows:
+        return {}
+
+    # None (missing prices) becomes nan
+    data = np.array(rows, dtype=float)
+    ids = data[:, 0].astype(np.int64)
+    fractions = np.asarray(percentiles, dtype=float) / 100
+
+    results: dict[int, dict[str, list[int]]] = {}
+    for i, (side, (_, _, descending)) in enumerate(SIDES.items()):
+        prices, volumes = data[:, 1 + 2 * i], data[:, 2 + 2 * i]
+        item_ids, values = _side_percentiles(
+            ids, prices, volumes, fractions, descending
+        )
+        rows = values.astype(int).tolist()
+        for item_id, row in zip(item_ids.tolist(), rows):
+            results.setdefault(item_id, {})[side] = row
+    return results
+
+
+def cached_volume_percentiles(
+    session: Session,
+    cache_dir: str | os.PathLike,
+    endpoint: str = '5m',
+    hours: float = 24,
+    percentiles=DEFAULT_PERCENTILES
+):
+    '''
+    Same as volume_percentiles, but caches results to a JSON file keyed by the
+    time window, so repeated calls within the same logging interval are
+    served from disk.
+    '''
+
+    cls = {'5m': AvgFiveMinPrice, '1h': AvgHourPrice}[endpoint]
+    end = session.execute(select(func.max(cls.timestamp))).scalar()
+    if end is None:
+        return {}
+
+    key = '_'.join(map(str, percentiles))
+    fname = Path(cache_dir) \
+        / f'percentiles_{endpoint}_{end}_{hours:g}h_{key}.json'
+
+    if fname.is_file():
+        logger.debug('Loading cached percentiles from %s', fname)
+        with open(fname) as f:
+            return {int(k): v for k, v in json.load(f).items()}
+
+    results = volume_percentiles(session, endpoint, hours, percentiles, end)
+
+    # discard percentiles cached for previous windows
+    fname.parent.mkdir(exist_ok=True)
+    for old in fname.parent.glob(f'percentiles_{endpoint}_*.json'):
+        if not old.name.startswith(f'percentiles_{endpoint}_{end}_'):
+            old.unlink(missing_ok=True)
+
+    with open(fname, 'w') as f:
+        json.dump(results, f)
+    return results
@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from .cache import load_cache
+from .dbschema import LatestPrice, AvgHourPrice
+
+logger = logging.getLogger(__name__)
+
+COINS_ID = 995
+GE_TAX_RATE = 0.01
+GE_TAX_CAP = 5_000_000
+
+
+def ge_tax(prices: np.ndarray):
+    '''Returns the Grand Exchange tax paid when selling one item at each of the given prices'''
+
+    return np.minimum(np.floor(prices * GE_TAX_RATE), GE_TAX_CAP)
+
+
+class RecipeIndex:
+    '''
+    Compiled form of the recipes dataset. Recipe inputs and outputs are stored
+    as sparse (recipe, item, quantity) triplets, where items are referenced by
+    their position in item_ids, so every recipe can be evaluated against a
+    set of dense price arrays at once.
+    '''
+
+    TRIPLET = np.dtype([('recipe', np.int32), ('item', np.int32),
+                        ('quantity', np.float64)])
+
+    def __init__(
+        self, names: list[str], item_ids: np.ndarray, inputs: np.ndarray,
+        outputs: np.ndarray
+    ):
+        '''
+        :param names: Recipe names
+        :param item_ids: Sorted ids of every item used by any recipe
+        :param inputs: Structured array of (recipe, item, quantity) input triplets
+        :param outputs: Structured array of (recipe, item, quantity) output triplets
+        '''
+
+        self.names = names
+        self.item_ids = item_ids
+        self.inputs = inputs
+        self.outputs = outputs
+
+    @classmethod
+    def from_recipes(cls, recipes: list[dict]):
+        '''
+        Compiles a list of recipes (from api.load_recipes). Each recipe must
+        have a name and lists of inputs and outputs, each containing item ids
+        and quantities. Recipes without any inputs or outputs are skipped.
+        '''
+
+        names = []
+        triplets: dict[str, list[tuple[int, int, float]]] = {
+            'inputs': [],
+            'outputs': []
+        }
+
+        for recipe in recipes:
+            parts = {
+                key: [
+                    (int(part['id']), float(part.get('quantity', 1)))
+                    for part in recipe.get(key) or [] if 'id' in part
+                ]
+                for key in triplets
+            }
+            if not all(parts.values()):
+                continue
+            for key, items in parts.items():
+                triplets[key] += [(len(names), i, q) for i, q in items]
+            names.append(recipe.get('name', ''))
+
+        item_ids = np.unique([
+            item_id for items in triplets.values() for _, item_id, _ in items
+        ]).astype(np.int64)
+
+        def compile_triplets(items):
+            arr = np.array(items, dtype=cls.TRIPLET)
+            arr['item'] = np.searchsorted(item_ids, arr['item'])
+            return arr
+
+        return cls(
+            names, item_ids, compile_triplets(triplets['inputs']),
+            compile_triplets(triplets['outputs'])
+        )
+
+    @classmethod
+    def build(cls, contents: bytes):
+        '''Compiles the contents of recipes.json into a dict of columns'''
+
+        index = cls.from_recipes(json.loads(contents))
+        return {
+            'names': index.names,
+            'item_ids': index.item_ids.tolist(),
+            'inputs': index.inputs.tobytes(),
+            'outputs': index.outputs.tobytes(),
+        }
+
+    @classmethod
+    def load(cls, fname: str | os.PathLike):
+        '''Loads and compiles recipes from a JSON file (using its cached binary form if possible)'''
+
+        columns = load_cache(fname, cls.build)
+        return cls(
+            columns['names'], np.array(columns['item_ids'], dtype=np.int64),
+            np.frombuffer(columns['inputs'], dtype=cls.TRIPLET),
+            np.frombuffer(columns['outputs'], dtype=cls.TRIPLET)
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def align(self, prices: dict[int, float]):
+        '''Returns a dense array of the given {item id: price} dict, aligned with item_ids'''
+
+        return np.array(
+            [prices.get(i, np.nan) for i in self.item_ids.tolist()],
+            dtype=float
+        )
+
+    def evaluate(
+        self,
+        high: np.ndarray,
+        low: np.ndarray,
+        volume: np.ndarray | None = None,
+        instant: bool = False
+    ):
+        '''
+        Evaluates the cost, revenue, and margin of every recipe in a single
+        vectorized pass. Prices are dense arrays aligned with item_ids, where
+        missing prices are nan. Returns a dict of arrays aligned with names.
+
+        By default, inputs are bought at the low price and outputs are sold at
+        the high price (ie: using buy and sell offers). Enabling instant
+        instead buys inputs at the high price and sells outputs at the low
+        price.
+
+        :param high: Current high (instabuy) price of each item
+        :param low: Current low (instasell) price of each item
+        :param volume: Daily traded volume of each item, used to estimate how many times each recipe can be made per day
+        :param instant: Whether to instantly buy inputs and sell outputs
+        '''
+
+        buy, sell = (high, low) if instant else (low, high)
+
+        # coins are sometimes used as recipe inputs (ie: for processing fees)
+        coins = self.item_ids == COINS_ID
+        buy = np.where(coins, 1, buy)
+        sell = np.where(coins, 1, sell)
+        tax = np.where(coins, 0, ge_tax(sell))
+
+        n = len(self.names)
+        inputs, outputs = self.inputs, self.outputs
+        cost = np.bincount(
+            inputs['recipe'],
+            weights=inputs['quantity'] * buy[inputs['item']],
+            minlength=n
+        )
+        revenue = np.bincount(
+            outputs['recipe'],
+            weights=outputs['quantity'] * sell[outputs['item']],
+            minlength=n
+        )
+        taxes = np.bincount(
+            outputs['recipe'],
+            weights=outputs['quantity'] * tax[outputs['item']],
+            minlength=n
+        )
+
+        results = {
+            'cost': cost,
+            'revenue': revenue,
+            'tax': taxes,
+            'margin': revenue - taxes - cost,
+        }
+
+        if volume is not None:
+            # the least liquid ingredient or product limits daily throughput
+            volume = np.where(coins, np.inf, volume)
+            throughput = np.full(n, np.inf)
+            for triplets in (inputs, outputs):
+                np.minimum.at(
+                    throughput, triplets['recipe'],
+                    volume[triplets['item']] / triplets['quantity']
+                )
+            results['volume'] = np.floor(throughput)
+        return results
+
+
+def load_snapshot(session: Session, index: RecipeIndex):
+    '''
+    Loads the latest high/low prices and the last 24 hours of traded volume
+    for every item in the index. Returns a tuple of dense (high, low, volume)
+    arrays aligned with the index's item ids.
+    '''
+
+    ts_latest = select(func.max(LatestPrice.timestamp)).scalar_subquery()
+    ts_hour = select(func.max(AvgHourPrice.timestamp)).scalar_subquery()
+
+    latest = session.execute(
+        select(LatestPrice.id, LatestPrice.high, LatestPrice.low)  #
+        .where(LatestPrice.timestamp == ts_latest)  #
+    ).all()
+    volumes = session.execute(
+        select(
+            AvgHourPrice.id,
+            func.sum(
+                AvgHourPrice.highPriceVolume + AvgHourPrice.lowPriceVolume
+            )
+        )  #
+        .where(AvgHourPrice.timestamp > ts_hour - 60 * 60 * 24)  #
+        .group_by(AvgHourPrice.id)  #
+    ).all()
+
+    high = index.align({row.id: row.high for row in latest if row.high})
+    low = index.align({row.id: row.low for row in latest if row.low})
+    volume = index.align(dict(volumes))
+    return high, low, np.nan_to_num(volume)
+
+
+def recipe_margins(
+    session: Session, index: RecipeIndex, instant: bool = False
+):
+    '''Evaluates every recipe in the index against the latest logged prices'''
+
+    high, low, volume = load_snapshot(session, index)
+
+    start = time.perf_counter()
+    results = index.evaluate(high, low, volume, instant=instant)
+    logger.debug(
+        'Evaluated %d recipes in %.2f ms', len(index),
+        (time.perf_counter() - start) * 1000
+    )
+    return results
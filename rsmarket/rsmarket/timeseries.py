@@ -0,0 +1,270 @@
+import logging
+import time
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+# the database is only needed to backfill the store, so reading it (ie: the
+# recent command) doesn't import sqlalchemy
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAME = 'rsmarket'
+DEFAULT_BUCKETS = 288
+
+ENDPOINTS = ('5m', '1h')
+FIELDS = ('avgHighPrice', 'highPriceVolume', 'avgLowPrice', 'lowPriceVolume')
+
+# prices and volumes never exceed the max cash stack, so they fit into int32
+MISSING = -1
+VERSION = 1
+
+# header fields (int64): version, number of items, number of buckets,
+# sequence number, then the next write position and number of filled
+# buckets for each endpoint
+HEADER_SIZE = 16
+H_VERSION, H_ITEMS, H_BUCKETS, H_SEQ = range(4)
+
+
+def _head_offset(endpoint_idx: int):
+    return 4 + 2 * endpoint_idx
+
+
+class RollingStore:
+    '''
+    Fixed-size ring buffers of the most recent 5m and 1h prices and volumes
+    of every item, stored in shared memory so that other processes can read
+    recent history without querying the database.
+
+    The logger creates the store and appends each snapshot as it's logged.
+    Readers attach to it by name and get zero-copy views of the buffers.
+    Every write increments a sequence number before and after updating the
+    buffers, so readers can detect and retry torn reads.
+    '''
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+
+        self.header = np.ndarray((HEADER_SIZE, ), np.int64, shm.buf)
+        if self.header[H_VERSION] != VERSION:
+            raise ValueError(
+                f'Unsupported shared memory version: {self.header[H_VERSION]}'
+            )
+
+        n_items = int(self.header[H_ITEMS])
+        n_buckets = int(self.header[H_BUCKETS])
+        offset = self.header.nbytes
+
+        self.item_ids = np.ndarray((n_items, ), np.int64, shm.buf, offset)
+        offset += self.item_ids.nbytes
+
+        self.timestamps: dict[str, np.ndarray] = {}
+        self.values: dict[str, np.ndarray] = {}
+        for endpoint in ENDPOINTS:
+            self.timestamps[endpoint] = np.ndarray((n_buckets, ), np.int64,
+                                                   shm.buf, offset)
+            offset += self.timestamps[endpoint].nbytes
+            self.values[endpoint] = np.ndarray((len(FIELDS), n_items,
+                                                n_buckets), np.int32, shm.buf,
+                                               offset)
+            offset += self.values[endpoint].nbytes
+
+    @staticmethod
+    def nbytes(n_items: int, n_buckets: int):
+        '''Returns the shared memory size required by a store of the given dimensions'''
+
+        per_endpoint = 8 * n_buckets + 4 * len(FIELDS) * n_items * n_buckets
+        return 8 * HEADER_SIZE + 8 * n_items + len(ENDPOINTS) * per_endpoint
+
+    @classmethod
+    def create(
+        cls,
+        item_ids,
+        n_buckets: int = DEFAULT_BUCKETS,
+        name: str = DEFAULT_NAME
+    ):
+        '''
+        Creates a new store in shared memory, replacing any stale store which
+        was left behind with the same name
+
+        :param item_ids: Ids of all items to store prices for
+        :param n_buckets: Number of most recent 5m and 1h buckets to keep
+        :param name: Name of the shared memory block
+        '''
+
+        item_ids = np.unique(np.fromiter(item_ids, np.int64))
+        size = cls.nbytes(len(item_ids), n_buckets)
+
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            logger.warning('Replacing existing shared memory block "%s"', name)
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        header = np.ndarray((HEADER_SIZE, ), np.int64, shm.buf)
+        header[:] = 0
+        header[[H_VERSION, H_ITEMS, H_BUCKETS]] = (
+            VERSION, len(item_ids), n_buckets
+        )
+        del header
+
+        store = cls(shm, owner=True)
+        store.item_ids[:] = item_ids
+        for endpoint in ENDPOINTS:
+            store.timestamps[endpoint][:] = 0
+            store.values[endpoint][:] = MISSING
+        return store
+
+    @classmethod
+    def attach(cls, name: str = DEFAULT_NAME):
+        '''Attaches to an existing store created by another process'''
+
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # python < 3.13 unlinks attached blocks at exit unless unregistered
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm)
+
+    def close(self):
+        '''Detaches from the store, and destroys it if this process created it'''
+
+        # views must be released before the buffer can be closed
+        self.header = self.item_ids = None
+        self.timestamps = self.values = {}
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, prices: dict):
+        '''
+        Appends a prices dict (from the 5m or 1h API endpoint) as the newest
+        bucket, overwriting the oldest one. Snapshots from other endpoints,
+        unknown items, and snapshots older than the newest bucket are ignored.
+        '''
+
+        endpoint = prices['endpoint']
+        if endpoint not in ENDPOINTS:
+            return False
+
+        timestamp = prices['timestamp']
+        e = ENDPOINTS.index(endpoint)
+        h = _head_offset(e)
+        head, count = self.header[h:h + 2]
+        n_buckets = len(self.timestamps[endpoint])
+        newest = self.timestamps[endpoint][(head - 1) % n_buckets]
+        if count and newest >= timestamp:
+            return False
+
+        data = prices['data']
+        ids = np.fromiter(map(int, data), np.int64, len(data))
+        pos = np.searchsorted(self.item_ids, ids)
+        pos[pos == len(self.item_ids)] = 0
+        known = self.item_ids[pos] == ids
+
+        column = np.full((len(FIELDS), len(self.item_ids)), MISSING, np.int32)
+        for f, field in enumerate(FIELDS):
+            values = np.fromiter(
+                (MISSING if (v := info.get(field)) is None else v
+                 for info in data.values()),
+                np.int64,
+                len(data)
+            )
+            column[f, pos[known]] = values[known]
+
+        self.header[H_SEQ] += 1
+        self.values[endpoint][:, :, head] = column
+        self.timestamps[endpoint][head] = timestamp
+        self.header[h:h + 2] = (
+            (head + 1) % n_buckets, min(count + 1, n_buckets)
+        )
+        self.header[H_SEQ] += 1
+        return True
+
+    def history(self, endpoint: str = '5m', item_ids=None, retries: int = 100):
+        '''
+        Returns a copy of the stored history of the given endpoint in
+        chronological order, as a tuple of (timestamps, {field: values}).
+        Value arrays have one row per item (in the order of item_ids, or
+        self.item_ids by default) and one column per timestamp. Missing
+        values are -1.
+        '''
+
+        e = ENDPOINTS.index(endpoint)
+        h = _head_offset(e)
+        if item_ids is None:
+            rows = slice(None)
+        else:
+            rows = np.searchsorted(self.item_ids, np.asarray(item_ids))
+            rows[rows == len(self.item_ids)] = 0
+            if np.any(self.item_ids[rows] != item_ids):
+                raise KeyError('Unknown item ids')
+
+        for _ in range(retries):
+            seq = self.header[H_SEQ]
+            if seq % 2:
+                time.sleep(0.001)
+                continue
+
+            head, count = self.header[h:h + 2]
+            n_buckets = len(self.timestamps[endpoint])
+            order = (np.arange(head - count, head)) % n_buckets
+            timestamps = self.timestamps[endpoint][order]
+            values = self.values[endpoint][:, rows][..., order]
+
+            if self.header[H_SEQ] == seq:
+                return timestamps, dict(zip(FIELDS, values))
+        raise TimeoutError('Shared memory store is being continuously updated')
+
+    def backfill(self, session: 'Session'):
+        '''Fills the store with the most recent buckets logged to the database'''
+
+        from sqlalchemy import select
+
+        from .db import PRICE_CLASSES
+
+        for endpoint in ENDPOINTS:
+            cls = PRICE_CLASSES[endpoint]
+            n_buckets = len(self.timestamps[endpoint])
+            timestamps = session.execute(
+                select(cls.timestamp).distinct()  #
+                .order_by(cls.timestamp.desc())  #
+                .limit(n_buckets)  #
+            ).scalars().all()
+            if not timestamps:
+                continue
+
+            query = (
+                select(cls.timestamp, cls.id,
+                       *(getattr(cls, f) for f in FIELDS))  #
+                .where(cls.timestamp >= min(timestamps))  #
+                .order_by(cls.timestamp)  #
+            )
+            snapshots: dict[int, dict] = {}
+            for ts, item_id, *values in session.execute(query):
+                data = snapshots.setdefault(ts, {})
+                data[str(item_id)] = dict(zip(FIELDS, values))
+
+            for ts, data in snapshots.items():
+                self.append(
+                    {'endpoint': endpoint, 'timestamp': ts, 'data': data}
+                )
+            logger.info(
+                'Loaded %d %s buckets into shared memory', len(snapshots),
+                endpoint
+            )
@@ -0,0 +1,99 @@
+import functools
+from datetime import datetime, timedelta, timezone
+
+from dateutil import tz
+
+DEFAULT_FORMAT = '%b %d %Y %H:%M'
+
+# timezone offsets only change on (at least) quarter-hour boundaries
+OFFSET_RESOLUTION = 15 * 60
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class TimestampFormatter:
+    '''
+    Converts UTC timestamps into local datetime strings. Timezone offsets are
+    cached per quarter hour and formatted strings are memoized, so repeated
+    timestamps (ie: every row of a snapshot) are only formatted once.
+    '''
+
+    def __init__(self, date_format: str = DEFAULT_FORMAT, tzinfo=None):
+        self.date_format = date_format
+        self.tzinfo = tzinfo or tz.tzlocal()
+        self.offsets: dict[int, int] = {}
+        self.strings: dict[int, str] = {}
+
+        # memoize by minute unless the format includes seconds (through any
+        # directive, ie: %S, %T, %X or %c)
+        probe = datetime(2000, 1, 1)
+        seconds = probe.strftime(date_format) \
+            != (probe + timedelta(seconds=1)).strftime(date_format)
+        self.resolution = 1 if seconds else 60
+
+    def offset(self, timestamp: int):
+        '''Returns the local timezone's UTC offset (in seconds) at the given timestamp'''
+
+        key = timestamp // OFFSET_RESOLUTION
+        if (offset := self.offsets.get(key)) is None:
+            utc = datetime.fromtimestamp(key * OFFSET_RESOLUTION, timezone.utc)
+            offset = utc.astimezone(self.tzinfo).utcoffset()
+            offset = int(offset.total_seconds())
+            self.offsets[key] = offset
+        return offset
+
+    def _format_local(self, local: int):
+        '''Formats local (offset) seconds truncated to the formatter's resolution'''
+
+        if (string := self.strings.get(local)) is None:
+            local_time = EPOCH + timedelta(seconds=local)
+            string = local_time.strftime(self.date_format)
+            self.strings[local] = string
+        return string
+
+    def __call__(self, timestamp: int):
+        timestamp = int(timestamp)
+        local = timestamp + self.offset(timestamp)
+        return self._format_local(local - local % self.resolution)
+
+    def format_array(self, timestamps):
+        '''
+        Formats a whole column of timestamps at once. Offsets are applied with
+        vectorized arithmetic, and each distinct value is only formatted once.
+        Returns a list of strings.
+        '''
+
+        import numpy as np
+
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if not len(timestamps):
+            return []
+
+        keys, key_idx = np.unique(
+            timestamps // OFFSET_RESOLUTION, return_inverse=True
+        )
+        offsets = np.array(
+            [self.offset(int(k) * OFFSET_RESOLUTION) for k in keys],
+            dtype=np.int64
+        )
+        local = timestamps + offsets[key_idx]
+        local -= local % self.resolution
+
+        values, inverse = np.unique(local, return_inverse=True)
+        strings = np.array(
+            [self._format_local(v) for v in values.tolist()], dtype=object
+        )
+        return strings[inverse].tolist()
+
+
+@functools.cache
+def get_formatter(date_format: str = DEFAULT_FORMAT):
+    '''Returns a shared, memoizing timestamp formatter for the given format'''
+
+    return TimestampFormatter(date_format)
+
+
+def format_timestamp(timestamp: int, date_format=DEFAULT_FORMAT):
+    '''Convert UTC timestamp to local datetime'''
+
+    return get_formatter(date_format)(timestamp)
@@ -0,0 +1,265 @@
+import heapq
+import logging
+import select as selectors
+import sys
+import time
+from typing import IO
+
+from sqlalchemy import Engine, select, func
+from sqlalchemy.orm import Session
+
+from .db import NOTIFY_CHANNEL, iter_commas, latest_margins_query
+from .dbschema import AvgHourPrice, LatestPrice, format_timestamp
+
+logger = logging.getLogger(__name__)
+
+# recompute every margin when more than this fraction of items have changed
+FULL_REFRESH_FRACTION = 0.5
+
+# timestamp before the first refresh, which differs from any database state
+# (including an empty database, whose latest timestamps are None)
+UNSEEN = object()
+
+
+class SnapshotPoller:
+    '''Waits for new snapshots by sleeping between polls'''
+
+    def __init__(self, interval: float):
+        self.interval = interval
+
+    def wait(self):
+        time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class SnapshotListener:
+    '''
+    Waits for new snapshots using PostgreSQL LISTEN/NOTIFY, which the logger
+    sends after each snapshot is logged (see db.notify_prices). Waiting times
+    out after the poll interval, in case the logger doesn't send them.
+    '''
+
+    def __init__(self, engine: Engine, interval: float):
+        self.interval = interval
+        self.conn = engine.raw_connection()
+        self.dbapi_conn = self.conn.driver_connection
+        self.dbapi_conn.autocommit = True
+        with self.dbapi_conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+
+    @classmethod
+    def supported(cls, engine: Engine):
+        return engine.dialect.name == 'postgresql' \
+            and engine.dialect.driver == 'psycopg2'
+
+    def wait(self):
+        selectors.select([self.dbapi_conn], [], [], self.interval)
+        self.dbapi_conn.poll()
+        for notify in self.dbapi_conn.notifies:
+            logger.debug('Notified of new prices: %s', notify.payload)
+        self.dbapi_conn.notifies.clear()
+
+    def close(self):
+        self.conn.close()
+
+
+class MarginWatcher:
+    '''
+    Tracks the top-k latest profit margins. Each refresh only recomputes the
+    margins of items whose latest prices changed since the previous snapshot,
+    unless new hourly volumes were logged (which affect every item).
+    '''
+
+    def __init__(self, k: int = 20):
+        self.k = k
+        self.headers: list[str] = []
+        self.ts_latest = self.ts_hour = UNSEEN
+        self.prices: dict[int, tuple] = {}
+        self.rows: dict[int, tuple] = {}
+        self.top: list[int] = []
+
+    def _profit(self, item_id: int):
+        profit = self.rows[item_id][0]
+        return -float('inf') if profit is None else profit
+
+    def _update_top(self):
+        self.top = heapq.nlargest(self.k, self.rows, key=self._profit)
+
+    @property
+    def top_rows(self):
+        '''Rows of the items with the top-k margins, highest first'''
+
+        return [self.rows[item_id] for item_id in self.top]
+
+    def _query(self, session: Session, ids: list[int] | None = None):
+        query = latest_margins_query(ids).add_columns(LatestPrice.id)
+        result = session.execute(query)
+        self.headers = list(result.keys())[:-1]
+        return {row[-1]: tuple(row[:-1]) for row in result}
+
+    def refresh(self, session: Session):
+        '''
+        Checks for a new snapshot and updates the margins of changed items.
+        Returns the number of changed items (None without a new snapshot).
+        '''
+
+        ts_latest, ts_hour = session.execute(
+            select(
+                select(func.max(LatestPrice.timestamp)).scalar_subquery(),
+                select(func.max(AvgHourPrice.timestamp)).scalar_subquery(),
+            )
+        ).one()
+        if (ts_latest, ts_hour) == (self.ts_latest, self.ts_hour):
+            return None
+
+        prices = {
+            row.id: (row.high, row.low)
+            for row in session.execute(
+                select(LatestPrice.id, LatestPrice.high, LatestPrice.low)  #
+                .where(LatestPrice.timestamp == ts_latest)  #
+            )
+        }
+        changed = [
+            item_id for item_id, price in prices.items()
+            if self.prices.get(item_id) != price
+        ]
+        changed += [
+            item_id for item_id in self.prices if item_id not in prices
+        ]
+
+        full = ts_hour != self.ts_hour \
+            or len(changed) > FULL_REFRESH_FRACTION * len(prices)
+
+        self.prices = prices
+        self.ts_latest, self.ts_hour = ts_latest, ts_hour
+
+        if full:
+            self.rows = self._query(session)
+            self._update_top()
+            return len(changed)
+
+        if not changed:
+            return 0
+
+        rows = self._query(session, changed)
+        for item_id in changed:
+            self.rows.pop(item_id, None)
+        self.rows.update(rows)
+
+        # the top k can only change if one of its items changed, or a changed
+        # item now beats the lowest of the top k
+        kth = self._profit(self.top[-1]) if len(self.top) == self.k else None
+        if kth is None or set(self.top).intersection(changed) or any(
+            self._profit(item_id) > kth for item_id in rows
+        ):
+            self._update_top()
+        return len(changed)
+
+
+class LineDisplay:
+    '''
+    Draws lines of text in a terminal, only rewriting lines which changed
+    since the previous draw. Non-terminal outputs are written in full.
+    '''
+
+    def __init__(self, out: IO[str] | None = None):
+        self.out = out or sys.stdout
+        self.tty = self.out.isatty()
+        self.lines: list[str] = []
+
+    def draw(self, lines: list[str]):
+        '''Draws the given lines, returning the number of rewritten lines'''
+
+        if not self.tty:
+            self.out.write('\n'.join(lines) + '\n\n')
+            self.out.flush()
+            return len(lines)
+
+        if not self.lines:
+            self.out.write('\x1b[2J')
+
+        rewritten = 0
+        for i in range(max(len(lines), len(self.lines))):
+            line = lines[i] if i < len(lines) else ''
+            if i < len(self.lines) and self.lines[i] == line:
+                continue
+            self.out.write(f'\x1b[{i + 1};1H{line}\x1b[K')
+            rewritten += 1
+
+        self.out.write(f'\x1b[{len(lines) + 1};1H')
+        self.out.flush()
+        self.lines = list(lines)
+        return rewritten
+
+
+def format_lines(headers: list[str], rows: list[tuple], widths: list[int]):
+    '''
+    Formats rows as table lines, like output.write_table. Column widths are
+    only ever widened (in place), so the lines of unchanged rows stay the same.
+    '''
+
+    rows = list(iter_commas(rows))
+    values = [headers] + [['' if v is None else str(v) for v in row]
+                          for row in rows]
+    for row in values:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len(value))
+
+    def format_row(row):
+        return '  '.join(
+            v.ljust(w) if h == 'name' else v.rjust(w)
+            for v, w, h in zip(row, widths, headers)
+        ).rstrip()
+
+    lines = [format_row(values[0]), '  '.join('-' * w for w in widths)]
+    return lines + [format_row(row) for row in values[1:]]
+
+
+def watch_margins(
+    engine: Engine,
+    k: int = 20,
+    interval: float = 10,
+    listen: bool = True,
+    out: IO[str] | None = None
+):
+    '''
+    Continuously shows the top-k latest profit margins, redrawing them as new
+    snapshots are logged
+
+    :param k: Number of items to show
+    :param interval: Seconds between polls for new snapshots
+    :param listen: Wait for notifications from the logger (PostgreSQL only)
+    '''
+
+    if listen and SnapshotListener.supported(engine):
+        waiter = SnapshotListener(engine, interval)
+    else:
+        waiter = SnapshotPoller(interval)
+
+    watcher = MarginWatcher(k)
+    display = LineDisplay(out)
+    widths = []
+
+    try:
+        with Session(engine) as session:
+            while True:
+                changed = watcher.refresh(session)
+                session.rollback()  # end the transaction to see new snapshots
+                if changed is not None:
+                    if len(widths) != len(watcher.headers):
+                        widths = [0] * len(watcher.headers)
+                    lines = format_lines(
+                        watcher.headers, watcher.top_rows, widths
+                    )
+                    lines.append('')
+                    lines.append(
+                        f'Prices at {format_timestamp(watcher.ts_latest)} '
+                        f'({changed} changed items)'
+                        if watcher.ts_latest is not None else 'No data to show'
+                    )
+                    display.draw(lines)
+                waiter.wait()
+    finally:
+        waiter.close()
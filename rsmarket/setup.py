@@ -15,7 +15,9 @@ setup(
     author_email='xunoaib@gmail.com',
     license='MIT',
     packages=['rsmarket'],
-    install_requires=['python-dateutil', 'requests', 'sqlalchemy', 'tabulate'],
+    install_requires=[
+        'numpy', 'python-dateutil', 'requests', 'sqlalchemy', 'tabulate'
+    ],
     entry_points={
         'console_scripts': ['rsmarket=rsmarket.main:main'],
     },